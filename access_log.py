@@ -0,0 +1,69 @@
+import threading
+import time
+from config import ACCESS_LOG_BATCH_SIZE, ACCESS_LOG_FLUSH_INTERVAL
+
+class AccessLogWriter:
+    """Journal des accès bufferisé en mémoire et écrit par lots dans user_access_log"""
+
+    def __init__(self, pool, batch_size=ACCESS_LOG_BATCH_SIZE, flush_interval=ACCESS_LOG_FLUSH_INTERVAL):
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Démarre le thread qui vide le buffer à intervalle régulier"""
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name='access-log-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def log(self, user_id, username, action):
+        """Ajoute un événement au buffer et déclenche une écriture si le seuil est atteint"""
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        with self._lock:
+            self._buffer.append((user_id, username, action, timestamp))
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def pending(self):
+        """Nombre d'événements en attente d'écriture"""
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self):
+        """Écrit tous les événements en attente dans une seule transaction"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                with self.pool.transaction() as conn:
+                    conn.executemany('''
+                        INSERT INTO user_access_log (user_id, username, action, timestamp)
+                        VALUES (?, ?, ?, ?)
+                    ''', batch)
+            except Exception as e:
+                print(f"Erreur lors de l'écriture du journal des accès: {e}")
+                with self._lock:
+                    self._buffer[:0] = batch
+                return 0
+            return len(batch)
+
+    def close(self):
+        """Arrête le thread et écrit les derniers événements"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
@@ -0,0 +1,49 @@
+from collections import Counter
+from config import PRICE_HISTOGRAM_BUCKET
+
+def _sorted_counts(counter):
+    """Compteur -> dict trié par nombre décroissant puis par valeur"""
+    return dict(sorted(counter.items(), key=lambda item: (-item[1], str(item[0]))))
+
+def driver_statistics(conn, price_bucket=PRICE_HISTOGRAM_BUCKET):
+    """Statistiques du catalogue calculées par SQLite (GROUP BY), sans charger les chauffeurs en mémoire"""
+    price_bucket = max(1, int(price_bucket))
+    # Chaque requête parcourt un index couvrant dans l'ordre du GROUP BY: ni tri, ni lecture des lignes
+    total = 0
+    cities, histogram = Counter(), Counter()
+    prices = {}
+    for city, price, count in conn.execute(
+            'SELECT city, monthly_price, COUNT(*) FROM drivers GROUP BY city, monthly_price'):
+        total += count
+        cities[city] += count
+        histogram[int(price // price_bucket) * price_bucket] += count
+        current = prices.setdefault(city, [0.0, price, price])
+        current[0] += price * count
+        current[1] = min(current[1], price)
+        current[2] = max(current[2], price)
+
+    vehicles, nationalities = Counter(), Counter()
+    for vehicle, nationality, count in conn.execute(
+            'SELECT vehicle_type, nationality, COUNT(*) FROM drivers GROUP BY vehicle_type, nationality'):
+        vehicles[vehicle] += count
+        nationalities[nationality] += count
+
+    # Couverture lue dans les tables de jonction, par leurs index couvrants
+    areas = {}
+    for city, area, count in conn.execute('SELECT city, area, COUNT(*) FROM driver_areas GROUP BY city, area'):
+        areas.setdefault(city, Counter())[area] = count
+    destinations = Counter(dict(conn.execute(
+        'SELECT destination, COUNT(*) FROM driver_destinations GROUP BY destination')))
+
+    return {
+        'total': total,
+        'cities': _sorted_counts(cities),
+        'vehicle_types': _sorted_counts(vehicles),
+        'nationalities': _sorted_counts(nationalities),
+        'prices': {city: {'min': low, 'max': high, 'avg': round(price_sum / cities[city], 2)}
+                   for city, (price_sum, low, high) in sorted(prices.items())},
+        'price_bucket': price_bucket,
+        'price_histogram': dict(sorted(histogram.items())),
+        'area_coverage': {city: _sorted_counts(counts) for city, counts in sorted(areas.items())},
+        'destination_coverage': _sorted_counts(destinations),
+    }
@@ -0,0 +1,89 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from config import DB_POOL_SIZE, RESULTS_PAGE_SIZE
+from database import DriverDatabase
+from metrics import DB_SECONDS
+
+class AsyncDriverDatabase:
+    """Façade asynchrone de DriverDatabase: les accès disque tournent dans un pool de threads"""
+
+    def __init__(self, db=None, max_workers=DB_POOL_SIZE):
+        self.db = db if db is not None else DriverDatabase()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='driver-db')
+
+    async def _run(self, func, *args, **kwargs):
+        """Exécute un appel bloquant hors de la boucle d'événements"""
+        loop = asyncio.get_running_loop()
+        with DB_SECONDS.time(method=func.__name__):
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def init_database(self):
+        """Version asynchrone de DriverDatabase.init_database"""
+        return await self._run(self.db.init_database)
+
+    async def load_from_excel(self, path=None, only_if_changed=False):
+        """Version asynchrone de DriverDatabase.load_from_excel"""
+        return await self._run(self.db.load_from_excel, path, only_if_changed=only_if_changed)
+
+    async def source_unchanged(self, path=None):
+        """Version asynchrone de DriverDatabase.source_unchanged"""
+        return await self._run(self.db.source_unchanged, path)
+
+    async def get_meta(self, key, default=None):
+        """Version asynchrone de DriverDatabase.get_meta"""
+        return await self._run(self.db.get_meta, key, default)
+
+    async def search_drivers(self, city=None, pickup_location=None, destination=None, after_id=None, limit=None,
+                             rank_by=None, after_rank=None):
+        """Version asynchrone de DriverDatabase.search_drivers"""
+        return await self._run(self.db.search_drivers, city, pickup_location, destination, after_id, limit,
+                               rank_by, after_rank)
+
+    async def top_drivers(self, city=None, pickup_location=None, destination=None, k=RESULTS_PAGE_SIZE,
+                          rank_by='price'):
+        """Version asynchrone de DriverDatabase.top_drivers"""
+        return await self._run(self.db.top_drivers, city, pickup_location, destination, k, rank_by)
+
+    async def search_drivers_page(self, city=None, pickup_location=None, destination=None,
+                                  after_id=None, limit=RESULTS_PAGE_SIZE, rank_by=None, after_rank=None):
+        """Version asynchrone de DriverDatabase.search_drivers_page"""
+        return await self._run(self.db.search_drivers_page, city, pickup_location, destination, after_id, limit,
+                               rank_by, after_rank)
+
+    async def check_catalog(self):
+        """Version asynchrone de DriverDatabase.check_catalog"""
+        return await self._run(self.db.check_catalog)
+
+    async def get_all_drivers(self):
+        """Version asynchrone de DriverDatabase.get_all_drivers"""
+        return await self._run(self.db.get_all_drivers)
+
+    async def driver_exists(self, mobile):
+        """Version asynchrone de DriverDatabase.driver_exists"""
+        return await self._run(self.db.driver_exists, mobile)
+
+    async def get_statistics(self, price_bucket=None):
+        """Version asynchrone de DriverDatabase.get_statistics"""
+        return await self._run(self.db.get_statistics, price_bucket)
+
+    async def add_driver(self, driver_data):
+        """Version asynchrone de DriverDatabase.add_driver"""
+        return await self._run(self.db.add_driver, driver_data)
+
+    async def add_drivers(self, rows):
+        """Version asynchrone de DriverDatabase.add_drivers"""
+        return await self._run(self.db.add_drivers, rows)
+
+    async def log_user_access(self, user_id, username, action):
+        """Version asynchrone de DriverDatabase.log_user_access"""
+        return await self._run(self.db.log_user_access, user_id, username, action)
+
+    async def flush_access_log(self):
+        """Version asynchrone de DriverDatabase.flush_access_log"""
+        return await self._run(self.db.flush_access_log)
+
+    async def close(self):
+        """Attend la fin des requêtes en cours puis ferme le pool"""
+        await self._run(self.db.close)
+        self._executor.shutdown(wait=True)
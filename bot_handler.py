@@ -1,16 +1,100 @@
+import asyncio
+import json
+import os
+import re
+import signal
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes, ConversationHandler
+from telegram.ext import (Application, ApplicationHandlerStop, CommandHandler, MessageHandler, CallbackQueryHandler,
+                          TypeHandler, filters, ContextTypes, ConversationHandler)
 from database import DriverDatabase
-from config import MESSAGES, CITIES, PICKUP_LOCATIONS, DESTINATIONS, BOT_TOKEN
+from async_database import AsyncDriverDatabase
+from config import (MESSAGES, CITIES, PICKUP_LOCATIONS, DESTINATIONS, BOT_TOKEN, DRIVER_FILE_WATCH_INTERVAL,
+                    RESULTS_PAGE_SIZE, RESULTS_RANK_BY, RUN_MODE, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH,
+                    WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS, WEBHOOK_MAX_CONCURRENCY,
+                    PERSISTENCE_ENABLED, CONVERSATION_TIMEOUT, USER_DATA_TTL, MAX_USER_DATA_ENTRIES,
+                    SESSION_SWEEP_INTERVAL, USER_DATA_SIZE_SAMPLE, RATE_LIMIT_ENABLED, RATE_LIMIT_USER_RATE,
+                    RATE_LIMIT_USER_BURST, RATE_LIMIT_GLOBAL_RATE, RATE_LIMIT_GLOBAL_BURST, RATE_LIMIT_NOTICE_INTERVAL,
+                    RATE_LIMIT_MAX_USERS, SEND_QUEUE_ENABLED, METRICS_ENABLED, METRICS_LISTEN, METRICS_PORT)
+from http_server import HttpServer
+from update_processor import PerChatUpdateProcessor
+from persistence import SQLitePersistence
+from sessions import SessionTracker, estimate_mapping_size
+from rate_limiter import RateLimiter
+from send_queue import SendQueue, PRIORITY_REPLY, PRIORITY_NOTICE
+from metrics import REGISTRY, UPDATES_TOTAL, observe_handler
+from rendering import (WELCOME_MENU, CITY_MENU, PICKUP_MENU, DESTINATION_MENU, REGISTRATION_START,
+                       REGISTRATION_AREAS_MENU, REGISTRATION_DESTINATIONS_MENU, REGISTRATION_DONE,
+                       REGISTRATION_EXISTS, ResultsRenderer)
+from registration_writer import RegistrationWriter
+from driver_import import normalize_mobile, validate_driver_row
 
 # États de conversation
-MAIN_MENU, SEARCH_DRIVER, SELECT_CITY, SELECT_PICKUP, SELECT_DESTINATION, DRIVER_REGISTRATION = range(6)
+MAIN_MENU, SEARCH_DRIVER, SELECT_CITY, SELECT_PICKUP, SELECT_DESTINATION = range(5)
+# Inscription d'un chauffeur, une question par état (5, l'ancien renvoi vers WhatsApp, reste réservé)
+(REG_NAME, REG_PHONE, REG_CITY, REG_AREAS, REG_DESTINATIONS, REG_VEHICLE, REG_NATIONALITY,
+ REG_PRICE) = range(6, 14)
+# Résultats affichés: seul cet état accepte '4' (page suivante)
+SHOW_RESULTS = 14
+
+# Réponse libre (texte qui n'est pas une commande)
+TEXT_INPUT = filters.TEXT & ~filters.COMMAND
+
+# Prix: '1800', '1800.5', '1,800' ou '١٬٨٠٠'; une virgule n'est acceptée que comme séparateur de milliers
+_PRICE_PATTERN = re.compile(r'\d+(?:[.٫]\d+)?|\d{1,3}(?:[,٬]\d{3})+(?:[.٫]\d+)?')
+
+def parse_price(text):
+    """Prix saisi -> float; None si le texte n'est pas un nombre sans ambiguïté ('1,5' est refusé)"""
+    text = text.strip()
+    if not _PRICE_PATTERN.fullmatch(text):
+        return None
+    return float(re.sub('[,٬]', '', text).replace('٫', '.'))
+
+def parse_choices(text, options):
+    """Choix multiples '1,5' ou '1 5' -> valeurs des options, sans doublons; None si un choix est inconnu"""
+    codes = [code for code in re.split(r'[\s,،]+', text.strip()) if code]
+    if not codes or any(code not in options for code in codes):
+        return None
+    values = []
+    for code in codes:
+        if options[code] not in values:
+            values.append(options[code])
+    return values
 
 class TelegramBot:
-    def __init__(self):
-        self.db = DriverDatabase()
-        self.application = Application.builder().token(BOT_TOKEN).build()
+    def __init__(self, db=None, request=None, token=None, metrics=METRICS_ENABLED,
+                 watch_interval=DRIVER_FILE_WATCH_INTERVAL):
+        self.db = db if db is not None else DriverDatabase()
+        # Serveur de métriques et surveillance du fichier Excel (désactivables, ex: tests de charge)
+        self.metrics_enabled = metrics
+        self.watch_interval = watch_interval
+        self.async_db = AsyncDriverDatabase(self.db)
+        self.renderer = ResultsRenderer()
+        self.watcher_task = None
+        self.metrics_server = None
+        self.update_processor = PerChatUpdateProcessor()
+        self.sessions = SessionTracker()
+        self.registrations = RegistrationWriter(self.db)
+        self.rate_limiter = RateLimiter(RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST, RATE_LIMIT_GLOBAL_RATE,
+                                        RATE_LIMIT_GLOBAL_BURST, RATE_LIMIT_NOTICE_INTERVAL, RATE_LIMIT_MAX_USERS)
+        builder = (
+            Application.builder()
+            .token(token or BOT_TOKEN)
+            .concurrent_updates(self.update_processor)
+            .post_init(self.on_startup)
+            .post_stop(self.on_stop)
+            .post_shutdown(self.on_shutdown)
+        )
+        if request is not None:
+            # API Telegram remplacée (ex: simulée par utils/load_test.py)
+            builder = builder.request(request).get_updates_request(request)
+        if PERSISTENCE_ENABLED:
+            # Conversations et filtres en cours conservés entre deux redémarrages
+            builder = builder.persistence(SQLitePersistence(self.db.pool))
+        self.application = builder.build()
+        self.send_queue = SendQueue(self.application.bot)
         self.setup_handlers()
+        self.register_metrics()
     
     def setup_handlers(self):
         """Configure les gestionnaires d'événements"""
@@ -22,158 +106,489 @@ class TelegramBot:
                     MessageHandler(filters.Regex('^2$'), self.driver_registration),
                     MessageHandler(filters.Regex('^3$'), self.exit_bot),
                 ],
+                SHOW_RESULTS: [
+                    MessageHandler(filters.Regex('^1$'), self.search_driver_start),
+                    MessageHandler(filters.Regex('^2$'), self.driver_registration),
+                    MessageHandler(filters.Regex('^3$'), self.exit_bot),
+                    MessageHandler(filters.Regex('^4$'), self.show_next_page),
+                ],
+                # Chaque état attend la réponse au menu envoyé juste avant (SELECT_CITY n'est plus
+                # utilisé: la ville est choisie dans SEARCH_DRIVER)
                 SEARCH_DRIVER: [
                     MessageHandler(filters.Regex('^[12]$'), self.select_city),
                 ],
-                SELECT_CITY: [
-                    MessageHandler(filters.Regex('^[12]$'), self.select_pickup_location),
-                ],
                 SELECT_PICKUP: [
-                    MessageHandler(filters.Regex('^[1-6]$'), self.select_destination),
+                    MessageHandler(filters.Regex('^[1-6]$'), self.select_pickup_location),
                 ],
                 SELECT_DESTINATION: [
-                    MessageHandler(filters.Regex('^[1-4]$'), self.show_results),
-                ],
-                DRIVER_REGISTRATION: [
-                    MessageHandler(filters.Regex('^1$'), self.return_to_main),
+                    MessageHandler(filters.Regex('^[1-4]$'), self.select_destination),
                 ],
+                REG_NAME: [MessageHandler(TEXT_INPUT, self.register_name)],
+                REG_PHONE: [MessageHandler(TEXT_INPUT, self.register_phone)],
+                REG_CITY: [MessageHandler(TEXT_INPUT, self.register_city)],
+                REG_AREAS: [MessageHandler(TEXT_INPUT, self.register_areas)],
+                REG_DESTINATIONS: [MessageHandler(TEXT_INPUT, self.register_destinations)],
+                REG_VEHICLE: [MessageHandler(TEXT_INPUT, self.register_vehicle)],
+                REG_NATIONALITY: [MessageHandler(TEXT_INPUT, self.register_nationality)],
+                REG_PRICE: [MessageHandler(TEXT_INPUT, self.register_price)],
             },
             fallbacks=[CommandHandler('start', self.start)],
+            name='driver_search',
+            persistent=PERSISTENCE_ENABLED,
+            conversation_timeout=CONVERSATION_TIMEOUT or None,
         )
         
+        # Groupes négatifs: exécutés avant la conversation pour chaque mise à jour
+        if RATE_LIMIT_ENABLED:
+            self.application.add_handler(TypeHandler(Update, self.rate_limit), group=-2)
+        self.application.add_handler(TypeHandler(Update, self.track_activity), group=-1)
         self.application.add_handler(conv_handler)
+        self.conv_handler = conv_handler
+    
+    def register_metrics(self):
+        """Jauges lues à chaque export de /metrics"""
+        cache = self.db.get_cache_stats
+        REGISTRY.gauge('bot_search_cache_hits_total', 'Recherches servies par le cache',
+                       lambda: cache()['hits'], kind='counter')
+        REGISTRY.gauge('bot_search_cache_misses_total', 'Recherches absentes du cache',
+                       lambda: cache()['misses'], kind='counter')
+        REGISTRY.gauge('bot_search_cache_hit_ratio', 'Part des recherches servies par le cache',
+                       lambda: cache()['hit_ratio'])
+        REGISTRY.gauge('bot_search_cache_entries', 'Entrées du cache de recherche', lambda: cache()['size'])
+        REGISTRY.gauge('bot_access_log_pending', "Accès en attente d'écriture", self.db.access_log.pending)
+        REGISTRY.gauge('bot_send_queue_pending', "Messages en attente d'envoi", self.send_queue.pending)
+        REGISTRY.gauge('bot_messages_sent_total', 'Messages envoyés par la file d\'envoi',
+                       lambda: self.send_queue.sent, kind='counter')
+        REGISTRY.gauge('bot_update_queue_size', "Mises à jour en attente de traitement",
+                       lambda: self.application.update_queue.qsize())
+        REGISTRY.gauge('bot_active_chats', 'Chats ayant une mise à jour en cours', self.update_processor.active_chats)
+        REGISTRY.gauge('bot_updates_dropped_total', "Mises à jour écartées: trop d'attente pour un même chat",
+                       lambda: self.update_processor.dropped, kind='counter')
+        REGISTRY.gauge('bot_rate_limited_total', 'Mises à jour écartées par la limitation de débit',
+                       lambda: self.rate_limiter.throttled, kind='counter')
+        REGISTRY.gauge('bot_live_conversations', 'Conversations en cours',
+                       lambda: len(self.open_conversations()))
+        REGISTRY.gauge('bot_registrations_pending', "Inscriptions en attente d'écriture", self.registrations.pending)
+        REGISTRY.gauge('bot_registrations_total', 'Chauffeurs inscrits depuis le bot',
+                       lambda: self.registrations.totals['inserted'], kind='counter')
+        REGISTRY.gauge('bot_user_data_entries', 'Utilisateurs ayant des données en mémoire',
+                       lambda: len(self.application.user_data))
+        REGISTRY.gauge('bot_user_data_bytes', 'Mémoire estimée de user_data (échantillon)',
+                       lambda: estimate_mapping_size(self.application.user_data, USER_DATA_SIZE_SAMPLE))
+    
+    async def handle_metrics(self, body, headers):
+        """Export des métriques au format Prometheus"""
+        return 200, 'text/plain; version=0.0.4; charset=utf-8', REGISTRY.render().encode('utf-8')
+    
+    async def reply(self, update: Update, text, priority=PRIORITY_REPLY):
+        """Répond dans le chat de la mise à jour, via la file d'envoi si elle est démarrée"""
+        if self.send_queue.running:
+            self.send_queue.send(update.effective_chat.id, text, priority)
+        else:
+            await update.effective_message.reply_text(text)
+    
+    async def rate_limit(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Écarte les messages au-delà du débit autorisé, avant toute requête à la base"""
+        user = update.effective_user
+        if user is None or self.rate_limiter.allow(user.id):
+            return
+        if update.effective_message is not None and self.rate_limiter.should_notify(user.id):
+            await self.reply(update, MESSAGES['rate_limited'], PRIORITY_NOTICE)
+        raise ApplicationHandlerStop
+    
+    async def track_activity(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Note la dernière activité de l'utilisateur (expiration de ses données)"""
+        UPDATES_TOTAL.inc()
+        if update.effective_user is not None:
+            self.sessions.touch(update.effective_user.id)
     
+    @observe_handler
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Démarre la conversation"""
         user = update.effective_user
-        self.db.log_user_access(user.id, user.username, "start")
+        await self.async_db.log_user_access(user.id, user.username, "start")
+        self.clear_search(context)
         
-        welcome_message = f"{MESSAGES['welcome']}\n\n{MESSAGES['select_service']}\n"
-        welcome_message += f"{MESSAGES['looking_for_driver']}\n"
-        welcome_message += f"{MESSAGES['driver_registration']}\n"
-        welcome_message += f"{MESSAGES['exit']}"
-        
-        await update.message.reply_text(welcome_message)
+        await self.reply(update, WELCOME_MENU)
         return MAIN_MENU
     
+    @observe_handler
     async def search_driver_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Démarre la recherche de chauffeur"""
         user = update.effective_user
-        self.db.log_user_access(user.id, user.username, "search_driver")
-        
-        context.user_data['search_filters'] = {}
+        await self.async_db.log_user_access(user.id, user.username, "search_driver")
         
-        city_message = f"{MESSAGES['select_city']}\n"
-        city_message += f"{MESSAGES['riyadh']}\n"
-        city_message += f"{MESSAGES['dammam']}"
+        self.clear_search(context)
         
-        await update.message.reply_text(city_message)
+        await self.reply(update, CITY_MENU)
         return SEARCH_DRIVER
     
+    def clear_search(self, context: ContextTypes.DEFAULT_TYPE):
+        """Oublie les filtres et le curseur de la recherche précédente"""
+        context.user_data['search_filters'] = {}
+        context.user_data.pop('search_cursor', None)
+        context.user_data.pop('search_offset', None)
+    
+    @observe_handler
     async def select_city(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Sélection de la ville"""
         user_choice = update.message.text
         if user_choice in CITIES:
-            context.user_data['search_filters']['city'] = CITIES[user_choice]
-            
-            pickup_message = f"{MESSAGES['select_pickup_location']}\n"
-            pickup_message += f"{MESSAGES['east']}\n"
-            pickup_message += f"{MESSAGES['west']}\n"
-            pickup_message += f"{MESSAGES['south']}\n"
-            pickup_message += f"{MESSAGES['north']}\n"
-            pickup_message += f"{MESSAGES['city_center']}\n"
-            pickup_message += f"{MESSAGES['outside_city']}"
-            
-            await update.message.reply_text(pickup_message)
+            context.user_data.setdefault('search_filters', {})['city'] = CITIES[user_choice]
+            await self.reply(update, PICKUP_MENU)
             return SELECT_PICKUP
         else:
-            await update.message.reply_text(MESSAGES['invalid_option'])
+            await self.reply(update, MESSAGES['invalid_option'])
             return SEARCH_DRIVER
     
+    @observe_handler
     async def select_pickup_location(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Sélection du lieu de prise en charge"""
         user_choice = update.message.text
         if user_choice in PICKUP_LOCATIONS:
-            context.user_data['search_filters']['pickup_location'] = PICKUP_LOCATIONS[user_choice]
-            
-            destination_message = f"{MESSAGES['select_destination']}\n"
-            destination_message += f"{MESSAGES['universities']}\n"
-            destination_message += f"{MESSAGES['schools']}\n"
-            destination_message += f"{MESSAGES['employees']}\n"
-            destination_message += f"{MESSAGES['others']}"
-            
-            await update.message.reply_text(destination_message)
+            context.user_data.setdefault('search_filters', {})['pickup_location'] = PICKUP_LOCATIONS[user_choice]
+            await self.reply(update, DESTINATION_MENU)
             return SELECT_DESTINATION
         else:
-            await update.message.reply_text(MESSAGES['invalid_option'])
+            await self.reply(update, MESSAGES['invalid_option'])
             return SELECT_PICKUP
     
+    @observe_handler
     async def select_destination(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Sélection de la destination"""
         user_choice = update.message.text
         if user_choice in DESTINATIONS:
-            context.user_data['search_filters']['destination'] = DESTINATIONS[user_choice]
+            context.user_data.setdefault('search_filters', {})['destination'] = DESTINATIONS[user_choice]
             return await self.show_results(update, context)
         else:
-            await update.message.reply_text(MESSAGES['invalid_option'])
+            await self.reply(update, MESSAGES['invalid_option'])
             return SELECT_DESTINATION
     
+    @observe_handler
     async def show_results(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Affiche les résultats de recherche"""
+        """Affiche la première page des résultats de recherche"""
+        context.user_data['search_cursor'] = None
+        context.user_data['search_offset'] = 0
+        return await self.show_results_page(update, context)
+    
+    @observe_handler
+    async def show_next_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Affiche la page de résultats suivante"""
+        if not context.user_data.get('search_cursor'):
+            await self.reply(update, MESSAGES['invalid_option'])
+            return MAIN_MENU
+        return await self.show_results_page(update, context)
+    
+    async def show_results_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Affiche une page de résultats à partir du curseur de l'utilisateur"""
         filters = context.user_data.get('search_filters', {})
+        cursor = context.user_data.get('search_cursor') or {}
+        offset = context.user_data.get('search_offset', 0)
+        criteria = (filters.get('city'), filters.get('pickup_location'), filters.get('destination'))
+        key = criteria + (cursor.get('after_id'), cursor.get('after_rank'), offset)
         
-        # Recherche dans la base de données
-        results = self.db.search_drivers(
-            city=filters.get('city'),
-            pickup_location=filters.get('pickup_location'),
-            destination=filters.get('destination')
-        )
-        
-        if results:
-            result_message = f"{MESSAGES['results_header']}\n\n"
-            for i, driver in enumerate(results, 1):
-                driver_name, mobile, nationality, vehicle_type, monthly_price = driver
-                result_message += f"{i}. اسم السائق: {driver_name}\n"
-                result_message += f"   رقم الجوال: {mobile}\n"
-                result_message += f"   الجنسية: {nationality}\n"
-                result_message += f"   نوع المركبة: {vehicle_type}\n"
-                result_message += f"   الرسوم الشهرية: {monthly_price} ريال\n\n"
-        else:
-            result_message = MESSAGES['no_results']
+        # Page déjà rendue pour ces filtres et cette version du catalogue (écritures externes comprises)
+        version = await self.async_db.check_catalog()
+        page = self.renderer.get(key, version)
+        if page is None:
+            results, next_cursor = await self.async_db.search_drivers_page(
+                *criteria, limit=RESULTS_PAGE_SIZE, rank_by=RESULTS_RANK_BY, **cursor
+            )
+            page = self.renderer.render(key, version, results, next_cursor, offset + 1)
+        result_message, next_cursor = page
         
-        # Retour au menu principal
-        result_message += f"\n{MESSAGES['select_service']}\n"
-        result_message += f"{MESSAGES['looking_for_driver']}\n"
-        result_message += f"{MESSAGES['driver_registration']}\n"
-        result_message += f"{MESSAGES['exit']}"
+        context.user_data['search_cursor'] = dict(next_cursor) if next_cursor else None
+        context.user_data['search_offset'] = offset + RESULTS_PAGE_SIZE
         
-        await update.message.reply_text(result_message)
-        return MAIN_MENU
+        await self.reply(update, result_message)
+        return SHOW_RESULTS if next_cursor else MAIN_MENU
     
+    @observe_handler
     async def driver_registration(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Gestion de l'inscription des chauffeurs"""
+        """Démarre l'inscription d'un chauffeur"""
         user = update.effective_user
-        self.db.log_user_access(user.id, user.username, "driver_registration")
-        
-        registration_message = f"{MESSAGES['contact_whatsapp']}\n"
-        registration_message += f"{MESSAGES['return_previous']}"
+        await self.async_db.log_user_access(user.id, user.username, "driver_registration")
         
-        await update.message.reply_text(registration_message)
-        return DRIVER_REGISTRATION
+        context.user_data['registration'] = {}
+        await self.reply(update, REGISTRATION_START)
+        return REG_NAME
+    
+    @observe_handler
+    async def register_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Inscription: nom du chauffeur"""
+        name = update.message.text.strip()
+        if not 2 <= len(name) <= 60:
+            await self.reply(update, MESSAGES['invalid_name'])
+            return REG_NAME
+        context.user_data.setdefault('registration', {})['driver_name'] = name
+        await self.reply(update, MESSAGES['ask_phone'])
+        return REG_PHONE
+    
+    @observe_handler
+    async def register_phone(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Inscription: numéro de mobile"""
+        mobile = normalize_mobile(update.message.text)
+        if mobile is None:
+            await self.reply(update, MESSAGES['invalid_phone'])
+            return REG_PHONE
+        # Profil existant (ou inscription en attente): pas de doublon, la mise à jour passe par WhatsApp
+        if self.registrations.is_pending(mobile) or await self.async_db.driver_exists(mobile):
+            context.user_data.pop('registration', None)
+            await self.reply(update, REGISTRATION_EXISTS)
+            return MAIN_MENU
+        context.user_data.setdefault('registration', {})['mobile_contact'] = mobile
+        await self.reply(update, CITY_MENU)
+        return REG_CITY
+    
+    @observe_handler
+    async def register_city(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Inscription: ville"""
+        user_choice = update.message.text.strip()
+        if user_choice not in CITIES:
+            await self.reply(update, MESSAGES['invalid_option'])
+            return REG_CITY
+        context.user_data.setdefault('registration', {})['city'] = CITIES[user_choice]
+        await self.reply(update, REGISTRATION_AREAS_MENU)
+        return REG_AREAS
+    
+    @observe_handler
+    async def register_areas(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Inscription: zones desservies (choix multiples)"""
+        areas = parse_choices(update.message.text, PICKUP_LOCATIONS)
+        if areas is None:
+            await self.reply(update, MESSAGES['invalid_option'])
+            return REG_AREAS
+        context.user_data.setdefault('registration', {})['area_of_support'] = ', '.join(areas)
+        await self.reply(update, REGISTRATION_DESTINATIONS_MENU)
+        return REG_DESTINATIONS
+    
+    @observe_handler
+    async def register_destinations(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Inscription: catégories de transport (choix multiples)"""
+        destinations = parse_choices(update.message.text, DESTINATIONS)
+        if destinations is None:
+            await self.reply(update, MESSAGES['invalid_option'])
+            return REG_DESTINATIONS
+        context.user_data.setdefault('registration', {})['delivery_classification'] = ', '.join(destinations)
+        await self.reply(update, MESSAGES['ask_vehicle'])
+        return REG_VEHICLE
     
-    async def return_to_main(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Retour au menu principal"""
-        return await self.start(update, context)
+    @observe_handler
+    async def register_vehicle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Inscription: type de véhicule"""
+        vehicle = update.message.text.strip()
+        if not 1 <= len(vehicle) <= 30:
+            await self.reply(update, MESSAGES['invalid_option'])
+            return REG_VEHICLE
+        context.user_data.setdefault('registration', {})['vehicle_type'] = vehicle
+        await self.reply(update, MESSAGES['ask_nationality'])
+        return REG_NATIONALITY
     
+    @observe_handler
+    async def register_nationality(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Inscription: nationalité"""
+        nationality = update.message.text.strip()
+        if not 1 <= len(nationality) <= 30:
+            await self.reply(update, MESSAGES['invalid_option'])
+            return REG_NATIONALITY
+        context.user_data.setdefault('registration', {})['nationality'] = nationality
+        await self.reply(update, MESSAGES['ask_price'])
+        return REG_PRICE
+    
+    @observe_handler
+    async def register_price(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Inscription: prix mensuel, puis mise en file de l'inscription"""
+        price = parse_price(update.message.text)
+        if price is None or not 0 < price < 100000:
+            await self.reply(update, MESSAGES['invalid_price'])
+            return REG_PRICE
+        
+        draft = context.user_data.pop('registration', {})
+        draft['monthly_price'] = price
+        row, error = validate_driver_row(draft)
+        if error is not None:
+            # Brouillon incomplet (ex: données expirées entre deux étapes): on recommence
+            context.user_data['registration'] = {}
+            await self.reply(update, REGISTRATION_START)
+            return REG_NAME
+        
+        # Écriture différée et groupée: le gestionnaire n'attend pas SQLite
+        self.registrations.submit(row)
+        user = update.effective_user
+        await self.async_db.log_user_access(user.id, user.username, "driver_registered")
+        await self.reply(update, REGISTRATION_DONE)
+        return MAIN_MENU
+    
+    @observe_handler
     async def exit_bot(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Quitte le bot"""
         user = update.effective_user
-        self.db.log_user_access(user.id, user.username, "exit")
+        await self.async_db.log_user_access(user.id, user.username, "exit")
         
-        await update.message.reply_text("شكراً لاستخدام البوت! 👋")
+        await self.reply(update, MESSAGES['goodbye'])
         return ConversationHandler.END
     
+    async def on_startup(self, application: Application):
+        """Démarre les tâches de fond du bot"""
+        if SEND_QUEUE_ENABLED:
+            await self.send_queue.start()
+        self.registrations.start()
+        if self.metrics_enabled:
+            server = HttpServer(METRICS_LISTEN, METRICS_PORT)
+            server.add_route('GET', '/metrics', self.handle_metrics)
+            try:
+                await server.start()
+                self.metrics_server = server
+                print(f"📈 Métriques sur http://{METRICS_LISTEN}:{server.port}/metrics")
+            except OSError as e:
+                print(f"⚠️ Serveur de métriques non démarré: {e}")
+        if self.watch_interval > 0:
+            self.watcher_task = asyncio.create_task(self.watch_driver_file())
+        # Utilisateurs rechargés par la persistance: expirent comme s'ils venaient d'écrire
+        for user_id in application.user_data:
+            self.sessions.touch(user_id)
+        if SESSION_SWEEP_INTERVAL > 0 and application.job_queue is not None:
+            application.job_queue.run_repeating(
+                self.evict_stale_sessions, interval=SESSION_SWEEP_INTERVAL, first=SESSION_SWEEP_INTERVAL,
+                name='evict_stale_sessions',
+            )
+    
+    def evict_stale_users(self):
+        """Supprime les données des utilisateurs inactifs ou en surnombre; retourne leur nombre"""
+        stale = self.sessions.stale(USER_DATA_TTL, MAX_USER_DATA_ENTRIES)
+        for user_id in stale:
+            self.application.drop_user_data(user_id)
+            self.sessions.forget(user_id)
+        # Conversations restées ouvertes (ex: rechargées par la persistance, sans minuterie):
+        # clés (chat_id, user_id), la suppression est propagée à la persistance
+        stale = set(stale)
+        if hasattr(self.conv_handler, '_update_state'):
+            for key in [key for key in self.open_conversations() if key[-1] in stale]:
+                self.conv_handler._update_state(ConversationHandler.END, key)
+        return len(stale)
+    
+    def open_conversations(self):
+        """Conversations ouvertes, clés (chat_id, user_id)
+
+        Lues dans l'état interne du ConversationHandler: python-telegram-bot est épinglé
+        à une version exacte (requirements.txt). Si l'attribut disparaît, les jauges
+        indiquent 0 et les conversations expirent seulement par CONVERSATION_TIMEOUT.
+        """
+        return getattr(self.conv_handler, '_conversations', {})
+    
+    async def evict_stale_sessions(self, context: ContextTypes.DEFAULT_TYPE):
+        """Tâche périodique de la job queue"""
+        evicted = self.evict_stale_users()
+        if evicted:
+            stats = self.get_session_stats()
+            print(f"🧹 {evicted} utilisateurs inactifs libérés ({stats['user_data']} restants, "
+                  f"~{stats['user_data_bytes'] // 1024} Ko)")
+    
+    def get_session_stats(self):
+        """Conversations en cours, utilisateurs suivis et mémoire approximative de user_data"""
+        user_data = self.application.user_data
+        return {
+            'live_conversations': len(self.open_conversations()),
+            'active_users': self.sessions.active(CONVERSATION_TIMEOUT or USER_DATA_TTL),
+            'tracked_users': len(self.sessions),
+            'user_data': len(user_data),
+            'user_data_bytes': estimate_mapping_size(user_data, USER_DATA_SIZE_SAMPLE),
+            'evicted': self.sessions.evicted,
+        }
+    
+    async def watch_driver_file(self):
+        """Recharge les chauffeurs dès que le fichier Excel change, sans redémarrer le bot"""
+        path = self.db.excel_path
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                # Fichier absent ou en cours d'écriture: on attend le prochain passage
+                if not os.path.exists(path) or time.time() - os.path.getmtime(path) < self.watch_interval:
+                    continue
+                # Fichier relu hors de la boucle puis appliqué en une courte transaction:
+                # les recherches continuent d'être servies avec l'ancien catalogue jusqu'au commit
+                report = await self.async_db.load_from_excel(path, only_if_changed=True)
+                if report and not report['source_unchanged']:
+                    print(f"🔄 Chauffeurs rechargés: +{report['inserted']} ~{report['updated']} "
+                          f"-{report['deleted']}")
+            except Exception as e:
+                print(f"Erreur lors de la surveillance du fichier Excel: {e}")
+    
+    async def on_stop(self, application: Application):
+        """Envoie les réponses encore en file, tant que le bot est joignable"""
+        await self.send_queue.stop()
+    
+    async def on_shutdown(self, application: Application):
+        """Arrête les tâches de fond et libère les ressources de la base de données"""
+        if self.watcher_task is not None:
+            self.watcher_task.cancel()
+            try:
+                await self.watcher_task
+            except asyncio.CancelledError:
+                pass
+            self.watcher_task = None
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+            self.metrics_server = None
+        # Inscriptions encore en file écrites avant la fermeture de la base
+        await asyncio.to_thread(self.registrations.close)
+        await self.async_db.close()
+    
+    async def handle_webhook_update(self, body, headers):
+        """Reçoit une mise à jour Telegram envoyée au webhook et la place dans la file de l'application"""
+        if WEBHOOK_SECRET and headers.get('x-telegram-bot-api-secret-token') != WEBHOOK_SECRET:
+            return 403, 'text/plain', b''
+        try:
+            payload = json.loads(body)
+            # Tableau, chaîne, null ou {}: pas une mise à jour
+            update = Update.de_json(payload, self.application.bot) if isinstance(payload, dict) else None
+        except (ValueError, TypeError, KeyError, AttributeError):
+            # AttributeError: champ imbriqué qui n'est pas un objet (ex: "message": "x")
+            return 400, 'text/plain', b''
+        if update is None:
+            return 400, 'text/plain', b''
+        await self.application.update_queue.put(update)
+        return 200, 'text/plain', b''
+    
+    async def run_webhook(self):
+        """Sert les mises à jour via un serveur HTTP local (derrière un proxy ou un répartiteur de charge)"""
+        server = HttpServer(WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_MAX_CONCURRENCY)
+        server.add_route('POST', WEBHOOK_PATH, self.handle_webhook_update)
+        
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:  # Windows
+                pass
+        
+        await self.application.initialize()
+        try:
+            await self.on_startup(self.application)
+            if WEBHOOK_URL:
+                await self.application.bot.set_webhook(
+                    url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                    secret_token=WEBHOOK_SECRET,
+                    max_connections=WEBHOOK_MAX_CONNECTIONS,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+            await self.application.start()
+            await server.start()
+            print(f"Webhook en écoute sur http://{WEBHOOK_LISTEN}:{server.port}{WEBHOOK_PATH}")
+            await stop.wait()
+        finally:
+            await server.stop()
+            if self.application.running:
+                await self.application.stop()
+            await self.on_stop(self.application)
+            await self.application.shutdown()
+            await self.on_shutdown(self.application)
+    
     def run(self):
-        """Lance le bot"""
+        """Lance le bot (mode polling ou webhook selon RUN_MODE)"""
         print("Bot démarré...")
-        self.application.run_polling() 
\ No newline at end of file
+        if RUN_MODE == 'webhook':
+            asyncio.run(self.run_webhook())
+        else:
+            self.application.run_polling() 
\ No newline at end of file
@@ -6,10 +6,131 @@ load_dotenv()
 # Configuration du bot Telegram
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
+# Mode de réception des mises à jour: 'polling' ou 'webhook'
+RUN_MODE = os.getenv('RUN_MODE', 'polling')
+
+# Webhook: serveur HTTP local, URL publique (ex: https://bot.example.com) et jeton secret
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+# Connexions simultanées ouvertes par Telegram, et requêtes traitées en parallèle par le serveur
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv('WEBHOOK_MAX_CONCURRENCY', '100'))
+
+# Traitement concurrent des mises à jour: chats différents en parallèle, un même chat dans l'ordre
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '32'))
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '1024'))
+# Mises à jour en attente pour un même chat au-delà desquelles les suivantes sont écartées
+# (un chat qui inonde le bot ne peut pas occuper toutes les places de UPDATE_MAX_PENDING)
+UPDATE_MAX_PENDING_PER_CHAT = int(os.getenv('UPDATE_MAX_PENDING_PER_CHAT', '16'))
+
+# Persistance des conversations (états et filtres de recherche) entre deux redémarrages
+PERSISTENCE_ENABLED = True
+# Intervalle (secondes) entre deux écritures groupées de la persistance
+PERSISTENCE_UPDATE_INTERVAL = 10.0
+
+# Sessions: une conversation inactive depuis CONVERSATION_TIMEOUT secondes est terminée (0 = jamais);
+# les données d'un utilisateur inactif depuis USER_DATA_TTL secondes sont supprimées, et au plus
+# MAX_USER_DATA_ENTRIES utilisateurs sont gardés en mémoire (les moins récents partent d'abord)
+CONVERSATION_TIMEOUT = int(os.getenv('CONVERSATION_TIMEOUT', '900'))
+USER_DATA_TTL = int(os.getenv('USER_DATA_TTL', '86400'))
+MAX_USER_DATA_ENTRIES = int(os.getenv('MAX_USER_DATA_ENTRIES', '10000'))
+SESSION_SWEEP_INTERVAL = 300
+# Utilisateurs mesurés (échantillon) pour estimer la mémoire de user_data
+USER_DATA_SIZE_SAMPLE = 200
+
+# Limitation de débit (jetons par seconde et réserve), par utilisateur et pour tout le bot;
+# un utilisateur limité reçoit au plus un avertissement toutes les RATE_LIMIT_NOTICE_INTERVAL secondes
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_USER_RATE = float(os.getenv('RATE_LIMIT_USER_RATE', '1.0'))
+RATE_LIMIT_USER_BURST = int(os.getenv('RATE_LIMIT_USER_BURST', '5'))
+RATE_LIMIT_GLOBAL_RATE = float(os.getenv('RATE_LIMIT_GLOBAL_RATE', '200'))
+RATE_LIMIT_GLOBAL_BURST = int(os.getenv('RATE_LIMIT_GLOBAL_BURST', '400'))
+RATE_LIMIT_NOTICE_INTERVAL = 10.0
+RATE_LIMIT_MAX_USERS = 10000
+
+# File d'envoi des réponses: limites de Telegram (~30 messages/s au total, ~1/s par chat)
+SEND_QUEUE_ENABLED = True
+SEND_GLOBAL_RATE = 30.0
+SEND_PER_CHAT_INTERVAL = 1.0
+# Envois simultanés vers l'API, tentatives sur erreur réseau, délai de vidage à l'arrêt (secondes)
+SEND_WORKERS = 8
+SEND_MAX_RETRIES = 3
+SEND_DRAIN_TIMEOUT = 5.0
+
+# Métriques au format Prometheus, servies en local sur http://METRICS_LISTEN:METRICS_PORT/metrics
+METRICS_ENABLED = True
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+
 # Configuration de la base de données
 DATABASE_PATH = 'drivers.db'
 EXCEL_FILE_PATH = 'drivers_data.xlsx'
 
+# Pool de connexions SQLite
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_POOL_TIMEOUT = 10.0
+DB_STATEMENT_CACHE_SIZE = 128
+DB_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -16000,
+    'busy_timeout': 5000,
+    'foreign_keys': 'ON',
+}
+
+# Import des fichiers de chauffeurs par lots
+IMPORT_BATCH_SIZE = 500
+# Ajout groupé (add_drivers): lignes par transaction, et nombre d'erreurs détaillées dans le rapport
+BULK_TRANSACTION_SIZE = 10000
+BULK_ERROR_SAMPLE = 20
+# Au-delà de ce nombre de chauffeurs ajoutés, l'index de recherche est reconstruit plutôt que complété
+BULK_INDEX_REBUILD_THRESHOLD = 2000
+
+# Largeur des tranches de prix (riyals) de l'histogramme des statistiques
+PRICE_HISTOGRAM_BUCKET = 250
+
+# Inscriptions des chauffeurs depuis le bot: écrites par lots de REGISTRATION_BATCH_SIZE,
+# ou au plus tard toutes les REGISTRATION_FLUSH_INTERVAL secondes
+REGISTRATION_BATCH_SIZE = 50
+REGISTRATION_FLUSH_INTERVAL = 2.0
+
+# Surveillance du fichier Excel pour recharger les chauffeurs à chaud (0 = désactivée)
+DRIVER_FILE_WATCH_INTERVAL = 10.0
+
+# Index de recherche en mémoire (bitsets par ville, zone et destination)
+SEARCH_INDEX_ENABLED = True
+# Version du catalogue relue au plus toutes les CATALOG_CHECK_INTERVAL secondes: une écriture
+# d'un autre processus (db_manager, autre instance) vide les caches et reconstruit l'index
+CATALOG_CHECK_INTERVAL = 1.0
+
+# Cache des résultats de recherche (clé: ville, zone, destination)
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 300.0
+
+# Nombre de chauffeurs affichés par page de résultats
+RESULTS_PAGE_SIZE = 5
+
+# Classement des résultats affichés par le bot: None (ordre d'inscription),
+# 'price' (moins cher d'abord), 'coverage' (plus de zones/destinations) ou 'score'
+RESULTS_RANK_BY = 'price'
+
+# Poids du score: prix mensuel, et réduction par zone ou destination couverte
+RANKING_WEIGHTS = {
+    'price': 1.0,
+    'coverage': 100.0,
+}
+
+# Nombre maximal de messages de résultats rendus gardés en mémoire
+RENDER_CACHE_SIZE = 512
+
+# Journal des accès (écriture différée par lots)
+ACCESS_LOG_BATCH_SIZE = 100
+ACCESS_LOG_FLUSH_INTERVAL = 5.0
+
 # Messages en arabe
 MESSAGES = {
     'welcome': 'مرحباً بك في دعم قائمة السائقين...',
@@ -36,7 +157,23 @@ MESSAGES = {
     'contact_whatsapp': 'يرجى الاتصال برقم الواتساب (05xxxxxxx) لتحديث ملفك.',
     'return_previous': 'أو اضغط 1 للعودة إلى القائمة السابقة.',
     'invalid_option': 'خيار غير صحيح، يرجى المحاولة مرة أخرى.',
-    'no_results': 'لا توجد نتائج متطابقة مع معايير البحث الخاصة بك.'
+    'no_results': 'لا توجد نتائج متطابقة مع معايير البحث الخاصة بك.',
+    'goodbye': 'شكراً لاستخدام البوت! 👋',
+    'next_page': '(4) الصفحة التالية',
+    'rate_limited': 'لقد أرسلت رسائل كثيرة، يرجى الانتظار قليلاً ثم المحاولة مرة أخرى.',
+    'registration_intro': 'سجّل ملفك كسائق في بضع خطوات. أرسل /start للإلغاء في أي وقت.',
+    'ask_name': 'يرجى إدخال اسمك الكامل:',
+    'invalid_name': 'الاسم غير صحيح، يرجى إدخال اسمك الكامل.',
+    'ask_phone': 'يرجى إدخال رقم الجوال (مثال: 05xxxxxxxx):',
+    'invalid_phone': 'رقم الجوال غير صحيح، يرجى المحاولة مرة أخرى.',
+    'already_registered': 'رقم الجوال هذا مسجل لدينا مسبقاً.',
+    'select_areas': 'يرجى اختيار مناطق العمل (يمكنك اختيار أكثر من رقم، مثال: 1,5):',
+    'select_destinations': 'يرجى اختيار فئات التوصيل (يمكنك اختيار أكثر من رقم، مثال: 1,2):',
+    'ask_vehicle': 'يرجى إدخال نوع المركبة (مثال: Sedan):',
+    'ask_nationality': 'يرجى إدخال جنسيتك:',
+    'ask_price': 'يرجى إدخال السعر الشهري بالريال:',
+    'invalid_price': 'السعر غير صحيح، يرجى إدخال رقم.',
+    'registration_received': 'شكراً! تم استلام طلب تسجيلك وسيظهر ملفك في نتائج البحث قريباً.'
 }
 
 # Options de filtrage
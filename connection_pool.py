@@ -0,0 +1,112 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_PRAGMAS, DB_STATEMENT_CACHE_SIZE
+
+class ConnectionPool:
+    """Pool borné de connexions SQLite réutilisables entre les appels"""
+
+    def __init__(self, db_path, pool_size=DB_POOL_SIZE, pragmas=None, timeout=DB_POOL_TIMEOUT):
+        self.db_path = db_path
+        self.pool_size = max(1, pool_size)
+        self.pragmas = DB_PRAGMAS if pragmas is None else pragmas
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    def _create_connection(self):
+        """Ouvre une connexion et applique les pragmas configurés"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE_SIZE,
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _acquire(self):
+        """Récupère une connexion libre ou en crée une nouvelle si le pool n'est pas plein"""
+        if self._closed:
+            raise RuntimeError("Le pool de connexions est fermé")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                try:
+                    return self._create_connection()
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("Aucune connexion SQLite disponible dans le pool")
+
+    def _release(self, conn):
+        """Rend une connexion au pool"""
+        if self._closed:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Fournit une connexion du pool (réentrant dans un même thread)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Fournit une connexion dans une transaction validée ou annulée automatiquement
+
+        Avec immediate, le verrou d'écriture est pris dès le début (BEGIN IMMEDIATE): une
+        transaction qui lit avant d'écrire ne peut plus échouer ("database is locked")
+        parce qu'un autre écrivain a validé entre-temps; les autres attendent busy_timeout.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            if immediate:
+                conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def close(self):
+        """Ferme toutes les connexions inactives du pool"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
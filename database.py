@@ -1,126 +1,688 @@
-import sqlite3
-import pandas as pd
-from config import DATABASE_PATH, EXCEL_FILE_PATH
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from config import (DATABASE_PATH, EXCEL_FILE_PATH, SEARCH_INDEX_ENABLED, IMPORT_BATCH_SIZE,
+                    RESULTS_PAGE_SIZE, RANKING_WEIGHTS, BULK_TRANSACTION_SIZE, BULK_ERROR_SAMPLE,
+                    BULK_INDEX_REBUILD_THRESHOLD, CATALOG_CHECK_INTERVAL)
+from connection_pool import ConnectionPool
+from access_log import AccessLogWriter
+from search_index import BitmapSearchIndex, RANK_MODES
+from search_cache import SearchCache
+from analytics import driver_statistics
+from driver_import import DRIVER_COLUMNS, normalize_driver_row, validate_driver_row, iter_driver_rows, batched
+
+def split_tokens(value):
+    """Découpe une liste séparée par des virgules en valeurs distinctes"""
+    tokens = []
+    for token in str(value).split(','):
+        token = token.strip()
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+# Origine des chauffeurs: la synchronisation du fichier Excel ne supprime que les siens
+SOURCE_EXCEL = 'excel'
+SOURCE_IMPORT = 'import'
+SOURCE_BOT = 'bot'
 
 class DriverDatabase:
-    def __init__(self):
-        self.db_path = DATABASE_PATH
+    def __init__(self, db_path=None):
+        self.db_path = db_path or DATABASE_PATH
         self.excel_path = EXCEL_FILE_PATH
+        self.pool = ConnectionPool(self.db_path)
+        self.access_log = AccessLogWriter(self.pool)
+        self.search_index = None
+        self.search_cache = SearchCache()
+        self.catalog_version = 0
+        # Dernière version du catalogue (db_meta) vue par cette instance
+        self._stored_version = None
+        self._checked_at = 0.0
+        self._catalog_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
         self.init_database()
-    
+        self.check_catalog(force=True)
+        self.refresh_search_index()
+        self.access_log.start()
+
     def init_database(self):
         """Initialise la base de données avec la table des chauffeurs"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS drivers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                driver_name TEXT NOT NULL,
-                mobile_contact TEXT NOT NULL,
-                city TEXT NOT NULL,
-                area_of_support TEXT NOT NULL,
-                monthly_price REAL NOT NULL,
-                vehicle_type TEXT NOT NULL,
-                nationality TEXT NOT NULL,
-                delivery_classification TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
-    def load_from_excel(self):
-        """Charge les données depuis le fichier Excel"""
-        try:
-            df = pd.read_excel(self.excel_path)
-            conn = sqlite3.connect(self.db_path)
-            
-            # Supprime les données existantes
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
-            cursor.execute('DELETE FROM drivers')
-            
-            # Insère les nouvelles données
-            df.to_sql('drivers', conn, if_exists='append', index=False)
-            
-            conn.commit()
-            conn.close()
-            return True
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS drivers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    driver_name TEXT NOT NULL,
+                    mobile_contact TEXT NOT NULL,
+                    city TEXT NOT NULL,
+                    area_of_support TEXT NOT NULL,
+                    monthly_price REAL NOT NULL,
+                    vehicle_type TEXT NOT NULL,
+                    nationality TEXT NOT NULL,
+                    delivery_classification TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    source TEXT NOT NULL DEFAULT 'excel'
+                )
+            ''')
+            # Base antérieure à la colonne source: tous ses chauffeurs venaient du fichier Excel
+            columns = {row[1] for row in cursor.execute('PRAGMA table_info(drivers)')}
+            if 'source' not in columns:
+                cursor.execute("ALTER TABLE drivers ADD COLUMN source TEXT NOT NULL DEFAULT 'excel'")
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_access_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    username TEXT,
+                    action TEXT NOT NULL,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # Tables de jonction chauffeur <-> zone et chauffeur <-> destination
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS driver_areas (
+                    driver_id INTEGER NOT NULL REFERENCES drivers(id) ON DELETE CASCADE,
+                    city TEXT NOT NULL,
+                    area TEXT NOT NULL,
+                    PRIMARY KEY (driver_id, area)
+                ) WITHOUT ROWID
+            ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS driver_destinations (
+                    driver_id INTEGER NOT NULL REFERENCES drivers(id) ON DELETE CASCADE,
+                    destination TEXT NOT NULL,
+                    PRIMARY KEY (driver_id, destination)
+                ) WITHOUT ROWID
+            ''')
+
+            # Index par ville couvrant aussi le classement par prix
+            cursor.execute('DROP INDEX IF EXISTS idx_drivers_city')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_drivers_city_price ON drivers (city, monthly_price)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_drivers_price ON drivers (monthly_price)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_drivers_mobile ON drivers (mobile_contact)')
+            # Index couvrant des statistiques par véhicule et nationalité
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_drivers_vehicle_nationality '
+                           'ON drivers (vehicle_type, nationality)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_driver_areas_lookup ON driver_areas (city, area, driver_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_driver_areas_area ON driver_areas (area, driver_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_driver_destinations_lookup ON driver_destinations (destination, driver_id)')
+
+            # Métadonnées (empreinte du dernier fichier importé, ...)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS db_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            ''')
+
+            # Base existante sans tables de jonction: on les reconstruit
+            cursor.execute('''
+                SELECT EXISTS (SELECT 1 FROM drivers)
+                   AND NOT EXISTS (SELECT 1 FROM driver_areas)
+                   AND NOT EXISTS (SELECT 1 FROM driver_destinations)
+            ''')
+            if cursor.fetchone()[0]:
+                self._rebuild_driver_links(conn)
+
+    def _index_driver_links(self, conn, rows):
+        """Insère les zones et destinations des chauffeurs (id, city, areas, destinations)"""
+        area_rows = []
+        destination_rows = []
+        for driver_id, city, areas, destinations in rows:
+            area_rows.extend((driver_id, city, area) for area in split_tokens(areas))
+            destination_rows.extend((driver_id, destination) for destination in split_tokens(destinations))
+
+        conn.executemany(
+            'INSERT OR IGNORE INTO driver_areas (driver_id, city, area) VALUES (?, ?, ?)',
+            area_rows
+        )
+        conn.executemany(
+            'INSERT OR IGNORE INTO driver_destinations (driver_id, destination) VALUES (?, ?)',
+            destination_rows
+        )
+
+    def _rebuild_driver_links(self, conn):
+        """Reconstruit entièrement les tables de jonction depuis la table drivers"""
+        conn.execute('DELETE FROM driver_areas')
+        conn.execute('DELETE FROM driver_destinations')
+        rows = conn.execute(
+            'SELECT id, city, area_of_support, delivery_classification FROM drivers'
+        )
+        self._index_driver_links(conn, rows.fetchall())
+
+    def refresh_search_index(self):
+        """Reconstruit l'index en mémoire; en cas d'échec les recherches passent par SQL"""
+        if not SEARCH_INDEX_ENABLED:
+            return False
+        try:
+            with self.pool.connection() as conn:
+                # Version lue avant la construction: une écriture concurrente rendra l'index périmé
+                version = self._read_catalog_version(conn)
+                index = BitmapSearchIndex.build(conn)
+        except Exception as e:
+            print(f"Erreur lors de la construction de l'index de recherche: {e}")
+            self.search_index = None
+            return False
+        index.version = version
+        with self._index_lock:
+            self.search_index = index
+        return True
+
+    def _catalog_changed(self):
+        """Signale une modification de la table drivers"""
+        self.catalog_version += 1
+        self.search_cache.invalidate()
+
+    def _read_catalog_version(self, conn):
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'catalog_version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _bump_catalog_version(self, conn):
+        """Incrémente la version du catalogue dans la transaction en cours; retourne (ancienne, nouvelle)"""
+        version = self._read_catalog_version(conn)
+        self._set_meta(conn, 'catalog_version', version + 1)
+        return version, version + 1
+
+    def _note_version(self, old_version, new_version):
+        """Version écrite par cette instance: pas besoin de la redécouvrir dans check_catalog"""
+        with self._catalog_lock:
+            if self._stored_version == old_version:
+                self._stored_version = new_version
+
+    def _apply_to_index(self, changes):
+        """Ajoute à l'index les chauffeurs de transactions validées [(ancienne version, nouvelle, lignes)]
+
+        Une transaction n'est appliquée que si l'index est exactement à sa version de départ:
+        sinon (reconstruction concurrente, écriture d'un autre processus) l'index reste
+        périmé et sera reconstruit à la prochaine recherche.
+        """
+        with self._index_lock:
+            index = self.search_index
+            for old_version, new_version, rows in changes:
+                if index is None or index.version != old_version:
+                    break
+                for driver_id, (name, mobile, city, areas, price, vehicle, nationality, destinations) in rows:
+                    if not index.add(driver_id, (name, mobile, nationality, vehicle, float(price)), city,
+                                     split_tokens(areas), split_tokens(destinations)):
+                        break
+                else:
+                    index.version = new_version
+                    continue
+                break
+
+    def check_catalog(self, force=False):
+        """Relit la version du catalogue (au plus toutes les CATALOG_CHECK_INTERVAL secondes)
+
+        Si la table drivers a été modifiée hors de cette instance, les caches sont vidés.
+        Retourne catalog_version, la version locale utilisée comme clé des caches.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < CATALOG_CHECK_INTERVAL:
+            return self.catalog_version
+        with self.pool.connection() as conn:
+            version = self._read_catalog_version(conn)
+        with self._catalog_lock:
+            self._checked_at = now
+            # La version ne fait que croître: une lecture plus ancienne qu'une écriture locale est ignorée
+            if self._stored_version is None or version > self._stored_version:
+                if self._stored_version is not None:
+                    self._catalog_changed()
+                self._stored_version = version
+        return self.catalog_version
+
+    def _current_index(self):
+        """Index à jour de la dernière version vue, reconstruit si besoin; None -> recherche SQL"""
+        index = self.search_index
+        if index is None or index.version >= self._stored_version:
+            return index
+        # Une seule reconstruction à la fois: les autres recherches passent par SQL en attendant
+        if not self._rebuild_lock.acquire(blocking=False):
+            return None
+        try:
+            index = self.search_index
+            if index is not None and index.version < self._stored_version:
+                self.refresh_search_index()
+                index = self.search_index
+        finally:
+            self._rebuild_lock.release()
+        if index is None or index.version < self._stored_version:
+            return None
+        return index
+
+    def get_meta(self, key, default=None):
+        """Lit une valeur de la table db_meta"""
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT value FROM db_meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, conn, key, value):
+        conn.execute(
+            'INSERT OR REPLACE INTO db_meta (key, value) VALUES (?, ?)',
+            (key, json.dumps(value))
+        )
+
+    def _file_signature(self, path, with_hash=True):
+        """Taille, date de modification et empreinte SHA-256 du fichier"""
+        stat = os.stat(path)
+        signature = {
+            'path': os.path.abspath(path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+        if with_hash:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            signature['sha256'] = digest.hexdigest()
+        return signature
+
+    def _check_source(self, path):
+        """(fichier inchangé, signature complète si elle a été calculée): le fichier est haché au plus une fois"""
+        previous = self.get_meta('source_file')
+        if not previous or not os.path.exists(path):
+            return False, None
+
+        # Même taille et même date: pas besoin de relire le fichier
+        signature = self._file_signature(path, with_hash=False)
+        if all(previous.get(key) == signature[key] for key in ('path', 'size', 'mtime_ns')):
+            return True, None
+
+        signature = self._file_signature(path)
+        if previous.get('path') == signature['path'] and previous.get('sha256') == signature['sha256']:
+            with self.pool.transaction() as conn:
+                self._set_meta(conn, 'source_file', signature)
+            return True, signature
+        return False, signature
+
+    def source_unchanged(self, path=None):
+        """Indique si le fichier est identique au dernier fichier importé"""
+        return self._check_source(path or self.excel_path)[0]
+
+    def load_from_excel(self, path=None, batch_size=IMPORT_BATCH_SIZE, only_if_changed=False):
+        """Synchronise la table drivers avec le fichier Excel (clé: mobile_contact)
+
+        Le fichier est lu en flux vers une base temporaire, puis les différences sont
+        appliquées en une courte transaction: la mémoire utilisée ne dépend pas de sa
+        taille et les autres écrivains ne sont bloqués que pendant cette transaction. Les fichiers .csv, .jsonl et .parquet sont aussi acceptés.
+        Seuls les chauffeurs venus du fichier sont supprimés quand ils en disparaissent.
+        Avec only_if_changed, rien n'est relu si le fichier n'a pas changé depuis
+        le dernier import ('source_unchanged' vaut alors True dans le rapport).
+        Retourne le nombre de lignes insérées, mises à jour, supprimées, inchangées
+        et ignorées, ou False en cas d'erreur.
+        """
+        path = path or self.excel_path
+        try:
+            signature = None
+            if only_if_changed:
+                unchanged, signature = self._check_source(path)
+                if unchanged:
+                    return {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'skipped': 0,
+                            'source_unchanged': True}
+            signature = signature or self._file_signature(path)
+
+            rows = iter_driver_rows(path)
+            with self.pool.connection() as conn:
+                staging_path = self._attach_staging(conn)
+                try:
+                    # Lecture du fichier sans bloquer les autres écrivains...
+                    skipped = self._stage_rows(conn, rows, batch_size)
+                    # ...puis différences appliquées sous le verrou d'écriture, pris avant la
+                    # première lecture de drivers (voir ConnectionPool.transaction)
+                    with self.pool.transaction(immediate=True):
+                        report = self._apply_staged(conn, batch_size)
+                        report['skipped'] = skipped
+                        self._set_meta(conn, 'source_file', signature)
+                        changed = report['inserted'] or report['updated'] or report['deleted']
+                        if changed:
+                            versions = self._bump_catalog_version(conn)
+                finally:
+                    self._detach_staging(conn, staging_path)
+            if changed:
+                self._note_version(*versions)
+                self.refresh_search_index()
+                self._catalog_changed()
+            report['source_unchanged'] = False
+            return report
         except Exception as e:
             print(f"Erreur lors du chargement depuis Excel: {e}")
             return False
-    
-    def search_drivers(self, city=None, pickup_location=None, destination=None):
-        """Recherche des chauffeurs selon les critères"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        query = "SELECT driver_name, mobile_contact, nationality, vehicle_type, monthly_price FROM drivers WHERE 1=1"
-        params = []
-        
-        if city:
-            query += " AND city = ?"
-            params.append(city)
-        
+
+    def _attach_staging(self, conn):
+        """Attache une base temporaire 'staging' sur disque (supprimée par _detach_staging)"""
+        fd, path = tempfile.mkstemp(prefix='drivers_sync_', suffix='.db')
+        os.close(fd)
+        conn.execute('ATTACH DATABASE ? AS staging', (path,))
+        conn.execute('PRAGMA staging.journal_mode = OFF')
+        conn.execute('PRAGMA staging.synchronous = OFF')
+        return path
+
+    def _detach_staging(self, conn, path):
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute('DETACH DATABASE staging')
+        os.remove(path)
+
+    def _stage_rows(self, conn, rows, batch_size=IMPORT_BATCH_SIZE):
+        """Copie les lignes normalisées dans staging.incoming; retourne le nombre de lignes ignorées
+
+        staging est un fichier à part: le remplir ne prend pas le verrou d'écriture de
+        la base principale, et la mémoire utilisée ne dépend pas de la taille du fichier.
+        """
+        definitions = ', '.join(
+            f"{column} {'REAL' if column == 'monthly_price' else 'TEXT'} NOT NULL" for column in DRIVER_COLUMNS
+        )
+        conn.execute(f'CREATE TABLE staging.incoming (seq INTEGER PRIMARY KEY, {definitions}, UNIQUE (mobile_contact))')
+        columns = ', '.join(DRIVER_COLUMNS)
+        placeholders = ', '.join('?' * len(DRIVER_COLUMNS))
+        skipped = 0
+        for batch in batched(rows, batch_size):
+            valid = []
+            for values in batch:
+                row = normalize_driver_row(values)
+                if row is None:
+                    skipped += 1
+                else:
+                    valid.append(row)
+            # Dernière occurrence d'un numéro retenue (REPLACE la replace aussi en fin de fichier)
+            conn.executemany(f'INSERT OR REPLACE INTO staging.incoming ({columns}) VALUES ({placeholders})', valid)
+        conn.commit()
+        return skipped
+
+    def _apply_staged(self, conn, batch_size=IMPORT_BATCH_SIZE):
+        """Applique uniquement les différences entre staging.incoming et la table drivers"""
+        report = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'skipped': 0}
+        assignments = ', '.join(f'{column} = ?' for column in DRIVER_COLUMNS)
+        columns = ', '.join(DRIVER_COLUMNS)
+        incoming_columns = ', '.join(f'i.{column}' for column in DRIVER_COLUMNS)
+        differs = ' OR '.join(f'd.{column} IS NOT i.{column}' for column in DRIVER_COLUMNS)
+
+        # Chauffeurs modifiés, et chauffeurs inscrits ou importés repris par le fichier (qui en
+        # décide désormais); en cas de doublons en base, on garde le plus ancien
+        matched = conn.execute('''
+            SELECT COUNT(*) FROM staging.incoming i
+            WHERE EXISTS (SELECT 1 FROM drivers d WHERE d.mobile_contact = i.mobile_contact)
+        ''').fetchone()[0]
+        to_update = conn.execute(f'''
+            SELECT {incoming_columns}, d.id FROM staging.incoming i
+            JOIN drivers d ON d.id = (SELECT MIN(id) FROM drivers WHERE mobile_contact = i.mobile_contact)
+            WHERE d.source != ? OR {differs}
+        ''', (SOURCE_EXCEL,)).fetchall()
+        conn.executemany(f"UPDATE drivers SET {assignments}, source = '{SOURCE_EXCEL}' WHERE id = ?", to_update)
+        updated_ids = [(row[-1],) for row in to_update]
+        conn.executemany('DELETE FROM driver_areas WHERE driver_id = ?', updated_ids)
+        conn.executemany('DELETE FROM driver_destinations WHERE driver_id = ?', updated_ids)
+        self._index_driver_links(conn, [(row[-1], row[2], row[3], row[7]) for row in to_update])
+        report['updated'] = len(to_update)
+        report['unchanged'] = matched - len(to_update)
+
+        # Nouveaux chauffeurs, dans l'ordre du fichier
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM drivers').fetchone()[0]
+        cursor = conn.execute(f'''
+            INSERT INTO drivers ({columns})
+            SELECT {incoming_columns} FROM staging.incoming i
+            WHERE NOT EXISTS (SELECT 1 FROM drivers d WHERE d.mobile_contact = i.mobile_contact)
+            ORDER BY i.seq
+        ''')
+        report['inserted'] = cursor.rowcount
+        inserted = conn.execute(
+            'SELECT id, city, area_of_support, delivery_classification FROM drivers WHERE id > ?',
+            (last_id,)
+        )
+        for batch in batched(inserted, batch_size):
+            self._index_driver_links(conn, batch)
+
+        # Chauffeurs du fichier qui n'y sont plus, et doublons en base (les liens partent en cascade);
+        # les chauffeurs inscrits depuis le bot ou importés par db_manager sont conservés
+        cursor = conn.execute('''
+            DELETE FROM drivers
+            WHERE (source = ? AND mobile_contact NOT IN (SELECT mobile_contact FROM staging.incoming))
+               OR id NOT IN (SELECT MIN(id) FROM drivers GROUP BY mobile_contact)
+        ''', (SOURCE_EXCEL,))
+        report['deleted'] = cursor.rowcount
+        return report
+
+    def search_drivers(self, city=None, pickup_location=None, destination=None, after_id=None, limit=None,
+                       rank_by=None, after_rank=None):
+        """Recherche des chauffeurs selon les critères (correspondance exacte des zones et destinations)"""
+        results, _ = self.search_drivers_page(city, pickup_location, destination, after_id, limit,
+                                              rank_by, after_rank)
+        return results
+
+    def top_drivers(self, city=None, pickup_location=None, destination=None, k=RESULTS_PAGE_SIZE, rank_by='price'):
+        """Les k meilleurs chauffeurs selon le classement demandé ('price', 'coverage' ou 'score')"""
+        return self.search_drivers(city, pickup_location, destination, limit=k, rank_by=rank_by)
+
+    def search_drivers_page(self, city=None, pickup_location=None, destination=None,
+                            after_id=None, limit=RESULTS_PAGE_SIZE, rank_by=None, after_rank=None):
+        """Recherche paginée par curseur
+
+        Sans rank_by les résultats suivent l'ordre des ids, sinon celui du classement
+        (voir search_index.RANK_MODES). Retourne les résultats de la page et le curseur
+        de la page suivante ({'after_id': ..., 'after_rank': ...}), ou None s'il n'y a
+        plus de résultats.
+        """
+        if rank_by is not None and rank_by not in RANK_MODES:
+            raise ValueError(f"Mode de classement inconnu: {rank_by}")
+
+        self.check_catalog()
+        key = (city, pickup_location, destination, after_id, limit, rank_by, after_rank)
+        cached = self.search_cache.get(key)
+        if cached is not None:
+            results, next_cursor = cached
+            return list(results), next_cursor and dict(next_cursor)
+
+        generation = self.search_cache.generation
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        fetch = limit + 1 if limit is not None else None
+        index = self._current_index()
+        if index is not None:
+            matches = index.search(city, pickup_location, destination, after_id, fetch, rank_by, after_rank)
+        else:
+            rows = self._search_drivers_sql(city, pickup_location, destination, after_id, fetch,
+                                            rank_by, after_rank)
+            matches = [(row[0], row[1], row[2:]) for row in rows]
+
+        next_cursor = None
+        if limit is not None and len(matches) > limit:
+            matches = matches[:limit]
+            last_id, last_rank, _ = matches[-1]
+            next_cursor = {'after_id': last_id}
+            if rank_by is not None:
+                next_cursor['after_rank'] = last_rank
+        results = [row for _, _, row in matches]
+        self.search_cache.put(key, (tuple(results), next_cursor), generation)
+        return results, next_cursor and dict(next_cursor)
+
+    def get_cache_stats(self):
+        """Compteurs de succès/échecs du cache de recherche"""
+        return self.search_cache.stats()
+
+    def _rank_expression(self, rank_by):
+        """Expression SQL équivalente à search_index.rank_value, et ses paramètres"""
+        coverage = ("((SELECT COUNT(*) FROM driver_areas x WHERE x.driver_id = d.id)"
+                    " + (SELECT COUNT(*) FROM driver_destinations y WHERE y.driver_id = d.id))")
+        if rank_by == 'price':
+            return "d.monthly_price", []
+        if rank_by == 'coverage':
+            return f"-{coverage}", []
+        return (f"(d.monthly_price * ? - {coverage} * ?)",
+                [RANKING_WEIGHTS['price'], RANKING_WEIGHTS['coverage']])
+
+    def _search_drivers_sql(self, city=None, pickup_location=None, destination=None, after_id=None, limit=None,
+                            rank_by=None, after_rank=None):
+        """Recherche via les tables de jonction indexées; retourne (id, rang, nom, mobile, ...)"""
+        if rank_by is None:
+            rank, rank_params = "NULL", []
+        else:
+            rank, rank_params = self._rank_expression(rank_by)
+        query = (f"SELECT d.id, {rank} AS rank_value, d.driver_name, d.mobile_contact, d.nationality, d.vehicle_type, "
+                 "d.monthly_price FROM drivers d")
+        conditions = []
+        params = list(rank_params)
+
         if pickup_location:
-            query += " AND area_of_support LIKE ?"
-            params.append(f"%{pickup_location}%")
-        
+            # La ville est dupliquée dans driver_areas pour utiliser l'index (city, area)
+            query += " JOIN driver_areas a ON a.driver_id = d.id"
+            if city:
+                conditions.append("a.city = ?")
+                params.append(city)
+            conditions.append("a.area = ?")
+            params.append(pickup_location)
+        elif city:
+            conditions.append("d.city = ?")
+            params.append(city)
+
         if destination:
-            query += " AND delivery_classification LIKE ?"
-            params.append(f"%{destination}%")
-        
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        
-        conn.close()
-        return results
-    
+            query += " JOIN driver_destinations t ON t.driver_id = d.id"
+            conditions.append("t.destination = ?")
+            params.append(destination)
+
+        if rank_by is None:
+            if after_id is not None:
+                conditions.append("d.id > ?")
+                params.append(after_id)
+            order = "d.id"
+        else:
+            if after_id is not None and after_rank is not None:
+                conditions.append(f"({rank}, d.id) > (?, ?)")
+                params.extend(rank_params + [after_rank, after_id])
+            order = "rank_value, d.id"
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {order}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self.pool.connection() as conn:
+            return conn.execute(query, params).fetchall()
+
     def get_all_drivers(self):
         """Récupère tous les chauffeurs"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM drivers")
-        results = cursor.fetchall()
-        
-        conn.close()
-        return results
-    
-    def add_driver(self, driver_data):
-        """Ajoute un nouveau chauffeur"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO drivers (driver_name, mobile_contact, city, area_of_support, 
-                               monthly_price, vehicle_type, nationality, delivery_classification)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', driver_data)
-        
-        conn.commit()
-        conn.close()
-    
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT * FROM drivers").fetchall()
+
+    def driver_exists(self, mobile):
+        """Indique si un chauffeur a déjà ce numéro de mobile"""
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT 1 FROM drivers WHERE mobile_contact = ?', (mobile,)).fetchone() is not None
+
+    def get_statistics(self, price_bucket=None):
+        """Statistiques agrégées du catalogue (villes, véhicules, nationalités, prix, couverture)"""
+        with self.pool.connection() as conn:
+            if price_bucket is None:
+                return driver_statistics(conn)
+            return driver_statistics(conn, price_bucket)
+
+    def add_driver(self, driver_data, source=SOURCE_IMPORT):
+        """Ajoute un nouveau chauffeur (conservé par la synchronisation du fichier Excel)"""
+        with self.pool.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO drivers (driver_name, mobile_contact, city, area_of_support,
+                                   monthly_price, vehicle_type, nationality, delivery_classification, source)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', tuple(driver_data) + (source,))
+            driver_id = cursor.lastrowid
+            self._index_driver_links(conn, [(driver_id, driver_data[2], driver_data[3], driver_data[7])])
+            old_version, new_version = self._bump_catalog_version(conn)
+
+        self._note_version(old_version, new_version)
+        self._apply_to_index([(old_version, new_version, [(driver_id, tuple(driver_data))])])
+        self._catalog_changed()
+        return driver_id
+
+    def add_drivers(self, rows, batch_size=IMPORT_BATCH_SIZE, transaction_size=BULK_TRANSACTION_SIZE,
+                    source=SOURCE_IMPORT):
+        """Ajoute des chauffeurs en masse (tuples dans l'ordre DRIVER_COLUMNS ou dictionnaires)
+
+        Chaque ligne est vérifiée selon les villes, zones et destinations des menus. Un numéro
+        de mobile déjà en base, ou déjà vu plus haut dans les lignes, est ignoré. Les insertions
+        sont validées par transactions de transaction_size lignes. Les chauffeurs sont marqués
+        avec leur origine (source): la synchronisation du fichier Excel ne les supprime pas.
+        Retourne le nombre de lignes insérées, en double et invalides, avec un échantillon des
+        erreurs (numéro de ligne, raison).
+        """
+        report = {'inserted': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+        columns = ', '.join(DRIVER_COLUMNS)
+        placeholders = ', '.join('?' * len(DRIVER_COLUMNS))
+        seen = set()
+        inserted = []
+        changes = []
+
+        def valid_rows():
+            for line_number, values in enumerate(rows, 1):
+                row, error = validate_driver_row(values)
+                if error is not None:
+                    report['invalid'] += 1
+                    if len(report['errors']) < BULK_ERROR_SAMPLE:
+                        report['errors'].append((line_number, error))
+                elif row[1] in seen:
+                    report['duplicates'] += 1
+                else:
+                    seen.add(row[1])
+                    yield row
+
+        try:
+            for chunk in batched(valid_rows(), transaction_size):
+                committed = []
+                # Verrou d'écriture pris avant les lectures: aucun autre écrivain ne peut ajouter
+                # un numéro vérifié ou un id au-delà de last_id avant le commit
+                with self.pool.transaction(immediate=True) as conn:
+                    for batch in batched(chunk, batch_size):
+                        mobiles = [row[1] for row in batch]
+                        existing = {mobile for (mobile,) in conn.execute(
+                            f"SELECT mobile_contact FROM drivers WHERE mobile_contact IN ({', '.join('?' * len(mobiles))})",
+                            mobiles
+                        )}
+                        to_insert = [row for row in batch if row[1] not in existing]
+                        report['duplicates'] += len(batch) - len(to_insert)
+                        if not to_insert:
+                            continue
+
+                        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM drivers').fetchone()[0]
+                        conn.executemany(f'INSERT INTO drivers ({columns}, source) VALUES ({placeholders}, ?)',
+                                         [row + (source,) for row in to_insert])
+                        by_mobile = {row[1]: row for row in to_insert}
+                        new_rows = [(driver_id, by_mobile[mobile]) for driver_id, mobile in conn.execute(
+                            'SELECT id, mobile_contact FROM drivers WHERE id > ? ORDER BY id', (last_id,)
+                        )]
+                        self._index_driver_links(conn, [(driver_id, row[2], row[3], row[7]) for driver_id, row in new_rows])
+                        committed.extend(new_rows)
+                    if committed:
+                        versions = self._bump_catalog_version(conn)
+                if committed:
+                    self._note_version(*versions)
+                    inserted.extend(committed)
+                    changes.append(versions + (committed,))
+                report['inserted'] = len(inserted)
+        finally:
+            # Transactions déjà validées: l'index et le cache doivent en tenir compte
+            if inserted:
+                # Au-delà de quelques milliers de lignes, reconstruire l'index coûte moins cher
+                if self.search_index is not None and len(inserted) > BULK_INDEX_REBUILD_THRESHOLD:
+                    self.refresh_search_index()
+                else:
+                    self._apply_to_index(changes)
+                self._catalog_changed()
+        return report
+
     def log_user_access(self, user_id, username, action):
-        """Enregistre l'accès des utilisateurs"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_access_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                username TEXT,
-                action TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            INSERT INTO user_access_log (user_id, username, action)
-            VALUES (?, ?, ?)
-        ''', (user_id, username, action))
-        
-        conn.commit()
-        conn.close() 
\ No newline at end of file
+        """Enregistre l'accès des utilisateurs (écriture différée par lots)"""
+        self.access_log.log(user_id, username, action)
+
+    def flush_access_log(self):
+        """Écrit immédiatement les accès en attente"""
+        return self.access_log.flush()
+
+    def close(self):
+        """Écrit les accès en attente puis ferme les connexions du pool"""
+        self.access_log.close()
+        self.pool.close()
@@ -0,0 +1,172 @@
+"""
+Lecture en flux des fichiers de chauffeurs (Excel, CSV, JSONL, Parquet) par lots de taille fixe
+"""
+
+import csv
+import json
+import os
+import re
+from itertools import islice
+from config import IMPORT_BATCH_SIZE, CITIES, PICKUP_LOCATIONS, DESTINATIONS
+
+# Colonnes attendues, dans l'ordre de la table drivers
+DRIVER_COLUMNS = (
+    'driver_name', 'mobile_contact', 'city', 'area_of_support',
+    'monthly_price', 'vehicle_type', 'nationality', 'delivery_classification'
+)
+
+def normalize_driver_row(values):
+    """Normalise une ligne (ordre DRIVER_COLUMNS); retourne None si elle est incomplète"""
+    row = []
+    for column, value in zip(DRIVER_COLUMNS, values):
+        if value is None or value != value:  # None ou NaN
+            return None
+        if column == 'monthly_price':
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return None
+        else:
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            value = str(value).strip()
+            if not value:
+                return None
+        row.append(value)
+    if len(row) != len(DRIVER_COLUMNS):
+        return None
+    return tuple(row)
+
+_MOBILE_PATTERN = re.compile(r'\+?\d{8,15}')
+_CITY_VALUES = frozenset(CITIES.values())
+_AREA_VALUES = frozenset(PICKUP_LOCATIONS.values())
+_DESTINATION_VALUES = frozenset(DESTINATIONS.values())
+
+def _split(value):
+    return [token.strip() for token in value.split(',') if token.strip()]
+
+def normalize_mobile(value):
+    """Numéro de mobile sans espaces ni tirets, ou None s'il est invalide"""
+    mobile = str(value).strip().replace(' ', '').replace('-', '')
+    return mobile if _MOBILE_PATTERN.fullmatch(mobile) else None
+
+def validate_driver_row(values):
+    """Normalise et vérifie une ligne selon les menus du bot; retourne (ligne, None) ou (None, raison)"""
+    if isinstance(values, dict):
+        values = [values.get(column) for column in DRIVER_COLUMNS]
+    # Zones et destinations acceptées aussi sous forme de listes (JSONL)
+    values = [', '.join(map(str, value)) if isinstance(value, (list, tuple)) else value for value in values]
+    row = normalize_driver_row(values)
+    if row is None:
+        return None, "champ manquant ou prix invalide"
+    name, mobile, city, areas, price, vehicle, nationality, destinations = row
+    normalized = normalize_mobile(mobile)
+    if normalized is None:
+        return None, f"numéro de mobile invalide: {mobile}"
+    mobile = normalized
+    if city not in _CITY_VALUES:
+        return None, f"ville inconnue: {city}"
+    area_list = _split(areas)
+    unknown = [area for area in area_list if area not in _AREA_VALUES]
+    if not area_list or unknown:
+        return None, f"zone inconnue: {', '.join(unknown) or areas}"
+    destination_list = _split(destinations)
+    unknown = [destination for destination in destination_list if destination not in _DESTINATION_VALUES]
+    if not destination_list or unknown:
+        return None, f"destination inconnue: {', '.join(unknown) or destinations}"
+    if price <= 0:
+        return None, f"prix invalide: {price}"
+    return (name, mobile, city, ', '.join(area_list), price, vehicle, nationality,
+            ', '.join(destination_list)), None
+
+def _column_positions(header):
+    """Position de chaque colonne attendue dans l'en-tête du fichier"""
+    header = [str(name).strip() if name is not None else '' for name in header]
+    missing = [column for column in DRIVER_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"Colonnes manquantes: {', '.join(missing)}")
+    return [header.index(column) for column in DRIVER_COLUMNS]
+
+def iter_excel_rows(path):
+    """Parcourt un classeur Excel ligne par ligne en mode lecture seule"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        positions = _column_positions(next(rows, ()))
+        for row in rows:
+            if row is None or all(value is None for value in row):
+                continue
+            yield tuple(row[i] if i < len(row) else None for i in positions)
+    finally:
+        workbook.close()
+
+def iter_csv_stream(stream):
+    """Parcourt un flux texte CSV (fichier ouvert, sys.stdin) ligne par ligne"""
+    reader = csv.reader(stream)
+    positions = _column_positions(next(reader, []))
+    for row in reader:
+        if not any(row):
+            continue
+        yield tuple(row[i] if i < len(row) else None for i in positions)
+
+def iter_csv_rows(path):
+    """Parcourt un fichier CSV ligne par ligne"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from iter_csv_stream(f)
+
+def iter_jsonl_stream(stream):
+    """Parcourt un flux JSON Lines: un objet par ligne, clés = DRIVER_COLUMNS"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Ligne {line_number}: JSON invalide")
+        if not isinstance(record, dict):
+            raise ValueError(f"Ligne {line_number}: un objet JSON est attendu")
+        # Zones et destinations en listes: même forme que dans le fichier Excel ("East, North")
+        yield tuple(', '.join(map(str, value)) if isinstance(value, list) else value
+                    for value in (record.get(column) for column in DRIVER_COLUMNS))
+
+def iter_jsonl_rows(path):
+    """Parcourt un fichier JSON Lines ligne par ligne"""
+    with open(path, encoding='utf-8-sig') as f:
+        yield from iter_jsonl_stream(f)
+
+def iter_parquet_rows(path, batch_size=IMPORT_BATCH_SIZE):
+    """Parcourt un fichier Parquet par lots (nécessite pyarrow)"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow est requis pour importer des fichiers Parquet (pip install pyarrow)")
+
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=list(DRIVER_COLUMNS)):
+        columns = [batch.column(column).to_pylist() for column in DRIVER_COLUMNS]
+        yield from zip(*columns)
+
+def iter_driver_rows(path):
+    """Choisit le lecteur selon l'extension du fichier"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return iter_excel_rows(path)
+    if extension == '.csv':
+        return iter_csv_rows(path)
+    if extension in ('.jsonl', '.ndjson'):
+        return iter_jsonl_rows(path)
+    if extension == '.parquet':
+        return iter_parquet_rows(path)
+    raise ValueError(f"Format de fichier non pris en charge: {extension}")
+
+def batched(rows, batch_size=IMPORT_BATCH_SIZE):
+    """Regroupe un itérable en listes d'au plus batch_size éléments"""
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,120 @@
+"""
+Petit serveur HTTP/1.1 asynchrone (asyncio) pour le webhook Telegram et les points de suivi
+"""
+
+import asyncio
+
+MAX_BODY_SIZE = 1 << 20
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+class HttpServer:
+    """Serveur HTTP minimal: routes (méthode, chemin) -> coroutine(body, headers)
+
+    Une route retourne (statut, type de contenu, corps en octets). Les connexions
+    persistantes (keep-alive) sont gérées; max_concurrency borne le nombre de
+    requêtes traitées en même temps.
+    """
+
+    def __init__(self, host, port, max_concurrency=100):
+        self.host = host
+        self.port = port
+        self.routes = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._server = None
+
+    def add_route(self, method, path, handler):
+        """Enregistre une route"""
+        self.routes[(method.upper(), path)] = handler
+
+    async def start(self):
+        """Démarre l'écoute"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Arrête l'écoute et ferme le serveur"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, b'', keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # Longueur négative ou non numérique: le corps ne peut pas être délimité
+                    await self._respond(writer, 400, b'', keep_alive=False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, 413, b'', keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                status, content_type, payload = await self._dispatch(method.upper(), target, body, headers)
+                await self._respond(writer, status, payload, content_type, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, method, target, body, headers):
+        path = target.split('?', 1)[0]
+        handler = self.routes.get((method, path))
+        if handler is None:
+            allowed = any(route_path == path for _, route_path in self.routes)
+            return (405 if allowed else 404), 'text/plain', b''
+        async with self._semaphore:
+            try:
+                return await handler(body, headers)
+            except Exception as e:
+                print(f"Erreur lors du traitement de {method} {path}: {e}")
+                return 500, 'text/plain', b''
+
+    async def _respond(self, writer, status, payload, content_type='text/plain', keep_alive=True):
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
@@ -60,14 +60,19 @@ def main():
     
     # Chargement des données depuis Excel
     print("📊 Chargement des données depuis Excel...")
-    if db.load_from_excel():
-        print("✅ Données chargées avec succès")
+    report = db.load_from_excel(only_if_changed=True)
+    if report and report['source_unchanged']:
+        print("✅ Fichier Excel inchangé depuis le dernier import, rechargement ignoré")
+    elif report:
+        print("✅ Données chargées avec succès "
+              f"(+{report['inserted']} ~{report['updated']} -{report['deleted']}, "
+              f"{report['unchanged']} inchangées)")
     else:
         print("⚠️ Erreur lors du chargement des données")
     
     # Démarrage du bot
     print("🤖 Démarrage du bot Telegram...")
-    bot = TelegramBot()
+    bot = TelegramBot(db)
     
     try:
         bot.run()
@@ -75,6 +80,15 @@ def main():
         print("\n👋 Bot arrêté par l'utilisateur")
     except Exception as e:
         print(f"❌ Erreur lors du démarrage du bot: {e}")
+    finally:
+        stats = db.get_cache_stats()
+        print(f"📈 Cache de recherche: {stats['hits']} succès, {stats['misses']} échecs "
+              f"({stats['hit_ratio']:.0%})")
+        sessions = bot.get_session_stats()
+        print(f"👥 Sessions: {sessions['live_conversations']} conversations, {sessions['user_data']} utilisateurs "
+              f"(~{sessions['user_data_bytes'] // 1024} Ko), {sessions['evicted']} expirés")
+        # Écrit les accès encore en mémoire avant de quitter
+        db.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+Métriques du bot (compteurs, histogrammes de durées, jauges) au format texte de Prometheus
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Bornes (secondes) des histogrammes de durée
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key):
+    if not key:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Compteur cumulatif, par combinaison d'étiquettes"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+class Histogram:
+    """Histogramme cumulatif (bornes fixes), avec somme et nombre d'observations"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Mesure la durée du bloc"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        series = self._series.get(_label_key(labels))
+        return series[2] if series else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((f'{self.name}_bucket', key + (('le', _format_value(bound)),), cumulative))
+                samples.append((f'{self.name}_bucket', key + (('le', '+Inf'),), count))
+                samples.append((f'{self.name}_sum', key, total))
+                samples.append((f'{self.name}_count', key, count))
+        return samples
+
+class Gauge:
+    """Valeur lue au moment de l'export: fn() retourne un nombre ou une liste (étiquettes, valeur)"""
+
+    def __init__(self, name, help_text, fn, kind='gauge'):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        value = self.fn()
+        if isinstance(value, (int, float)):
+            return [(self.name, (), value)]
+        return [(self.name, _label_key(labels), sample) for labels, sample in value]
+
+class MetricsRegistry:
+    """Ensemble des métriques exportées; une métrique enregistrée sous un nom existant le remplace"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text):
+        return self.register(Counter(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, buckets))
+
+    def gauge(self, name, help_text, fn, kind='gauge'):
+        return self.register(Gauge(name, help_text, fn, kind))
+
+    def render(self):
+        """Export au format texte de Prometheus (version 0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"Erreur lors de la lecture de la métrique {metric.name}: {e}")
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, key, value in samples:
+                lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+HANDLER_SECONDS = REGISTRY.histogram('bot_handler_duration_seconds', 'Durée des gestionnaires de conversation')
+HANDLER_ERRORS = REGISTRY.counter('bot_handler_errors_total', 'Exceptions levées par les gestionnaires')
+DB_SECONDS = REGISTRY.histogram('bot_db_call_duration_seconds',
+                                'Durée des appels à la base de données (attente du pool de threads comprise)')
+UPDATES_TOTAL = REGISTRY.counter('bot_updates_total', 'Mises à jour Telegram reçues')
+
+def observe_handler(func):
+    """Décorateur: mesure la durée d'un gestionnaire asynchrone et compte ses erreurs"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=func.__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, handler=func.__name__)
+    return wrapper
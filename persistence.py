@@ -0,0 +1,201 @@
+"""
+Persistance SQLite des conversations et de context.user_data, écrite par lots
+"""
+
+import asyncio
+import json
+import threading
+from telegram.ext import BasePersistence, PersistenceInput
+from config import CITIES, PICKUP_LOCATIONS, DESTINATIONS, PERSISTENCE_UPDATE_INTERVAL
+
+# Codes courts des filtres de recherche (ceux du menu: '1', '2', ...)
+_FILTER_OPTIONS = (
+    ('city', CITIES),
+    ('pickup_location', PICKUP_LOCATIONS),
+    ('destination', DESTINATIONS),
+)
+_FILTER_CODES = {
+    name: {value: code for code, value in options.items()} for name, options in _FILTER_OPTIONS
+}
+
+def encode_user_data(data):
+    """Encodage JSON compact: filtres en codes de menu, curseur en liste"""
+    data = dict(data)
+    compact = {}
+
+    filters = data.pop('search_filters', None)
+    if filters is not None:
+        codes = [_FILTER_CODES[name].get(filters.get(name)) for name, _ in _FILTER_OPTIONS]
+        decoded = {
+            name: options[code] for (name, options), code in zip(_FILTER_OPTIONS, codes) if code is not None
+        }
+        # Valeurs hors des menus: on garde le dictionnaire tel quel
+        if decoded == filters:
+            compact['f'] = codes
+        else:
+            compact['search_filters'] = filters
+
+    cursor = data.pop('search_cursor', None)
+    if cursor:
+        compact['c'] = [cursor.get('after_id'), cursor.get('after_rank')]
+    if 'search_offset' in data:
+        compact['o'] = data.pop('search_offset')
+
+    compact.update(data)
+    return json.dumps(compact, separators=(',', ':'), ensure_ascii=False)
+
+def decode_user_data(payload):
+    """Inverse de encode_user_data"""
+    compact = json.loads(payload)
+    data = {}
+
+    codes = compact.pop('f', None)
+    if codes is not None:
+        data['search_filters'] = {
+            name: options[code] for (name, options), code in zip(_FILTER_OPTIONS, codes) if code is not None
+        }
+    cursor = compact.pop('c', None)
+    if cursor is not None:
+        data['search_cursor'] = {'after_id': cursor[0]}
+        if cursor[1] is not None:
+            data['search_cursor']['after_rank'] = cursor[1]
+    if 'o' in compact:
+        data['search_offset'] = compact.pop('o')
+
+    data.update(compact)
+    return data
+
+class SQLitePersistence(BasePersistence):
+    """Conserve les états de conversation et user_data dans la base SQLite du bot
+
+    L'application appelle update_* toutes les update_interval secondes pour les seules
+    données modifiées; ces appels sont regroupés en mémoire puis écrits dans une seule
+    transaction, hors de la boucle d'événements.
+    """
+
+    def __init__(self, pool, update_interval=PERSISTENCE_UPDATE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.pool = pool
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._write_task = None
+        self._writing = False
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS bot_persistence (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (kind, key)
+                ) WITHOUT ROWID
+            ''')
+
+    def _load(self, kind):
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT key, value FROM bot_persistence WHERE kind = ?', (kind,)).fetchall()
+
+    def _queue(self, kind, key, value):
+        """Met une écriture (ou une suppression si value est None) en attente"""
+        with self._lock:
+            self._pending[(kind, key)] = value
+            start_writer = not self._writing
+            self._writing = True
+        if start_writer:
+            self._write_task = asyncio.get_running_loop().create_task(self._write_soon())
+
+    async def _write_soon(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Laisse les autres update_* du même passage s'ajouter au lot
+            await asyncio.sleep(0)
+            try:
+                await loop.run_in_executor(None, self._write_pending)
+            except Exception as e:
+                print(f"Erreur lors de l'écriture de la persistance: {e}")
+                with self._lock:
+                    self._writing = False
+                return
+            with self._lock:
+                if not self._pending:
+                    self._writing = False
+                    return
+
+    def _write_pending(self):
+        """Écrit toutes les modifications en attente dans une seule transaction"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        upserts = [(kind, key, value) for (kind, key), value in pending.items() if value is not None]
+        deletes = [(kind, key) for (kind, key), value in pending.items() if value is None]
+        try:
+            with self.pool.transaction() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO bot_persistence (kind, key, value) VALUES (?, ?, ?)', upserts
+                )
+                conn.executemany('DELETE FROM bot_persistence WHERE kind = ? AND key = ?', deletes)
+        except Exception:
+            # On garde les modifications pour le prochain passage, sans écraser les plus récentes
+            with self._lock:
+                for item, value in pending.items():
+                    self._pending.setdefault(item, value)
+            raise
+        return len(pending)
+
+    async def get_user_data(self):
+        return {int(key): decode_user_data(value) for key, value in self._load('user')}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        conversations = {}
+        for key, value in self._load(f'conversation:{name}'):
+            conversations[tuple(json.loads(key))] = json.loads(value)
+        return conversations
+
+    async def update_conversation(self, name, key, new_state):
+        value = None if new_state is None else json.dumps(new_state)
+        self._queue(f'conversation:{name}', json.dumps(list(key), separators=(',', ':')), value)
+
+    async def update_user_data(self, user_id, data):
+        self._queue('user', str(user_id), encode_user_data(data))
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_user_data(self, user_id):
+        self._queue('user', str(user_id), None)
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Appelé à l'arrêt de l'application: écrit ce qui reste en attente"""
+        if self._write_task is not None:
+            await asyncio.gather(self._write_task, return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(None, self._write_pending)
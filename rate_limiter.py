@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+
+class TokenBucket:
+    """Seau à jetons: `rate` jetons par seconde, au plus `capacity` en réserve"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+class RateLimiter:
+    """Limite le débit par utilisateur et pour l'ensemble du bot
+
+    Un message consomme un jeton du seau de l'utilisateur et un du seau global; il est
+    refusé si l'un des deux est vide. Les seaux des utilisateurs sont gardés dans un LRU
+    borné par max_users (un seau oublié repart plein, ce qui reste sans danger).
+    """
+
+    def __init__(self, user_rate, user_burst, global_rate, global_burst, notice_interval, max_users):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.notice_interval = notice_interval
+        self.max_users = max_users
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        self._users = OrderedDict()
+        self._notified = {}
+        self.allowed = 0
+        self.throttled = 0
+
+    def allow(self, user_id, now=None):
+        """True si le message de l'utilisateur peut être traité"""
+        now = time.monotonic() if now is None else now
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = self._users[user_id] = TokenBucket(self.user_rate, self.user_burst, now)
+            if len(self._users) > self.max_users:
+                evicted, _ = self._users.popitem(last=False)
+                self._notified.pop(evicted, None)
+        else:
+            self._users.move_to_end(user_id)
+
+        if bucket.refill(now) < 1 or self._global.refill(now) < 1:
+            self.throttled += 1
+            return False
+        bucket.tokens -= 1
+        self._global.tokens -= 1
+        self.allowed += 1
+        return True
+
+    def should_notify(self, user_id, now=None):
+        """True au plus une fois par notice_interval pour un utilisateur limité"""
+        now = time.monotonic() if now is None else now
+        last = self._notified.get(user_id)
+        if last is not None and now - last < self.notice_interval:
+            return False
+        self._notified[user_id] = now
+        return True
+
+    def stats(self):
+        return {'allowed': self.allowed, 'throttled': self.throttled, 'tracked_users': len(self._users)}
@@ -0,0 +1,83 @@
+import threading
+from config import REGISTRATION_BATCH_SIZE, REGISTRATION_FLUSH_INTERVAL
+from database import SOURCE_BOT
+
+class RegistrationWriter:
+    """Inscriptions de chauffeurs reçues par le bot, mises en file et ajoutées par lots (add_drivers)"""
+
+    def __init__(self, db, batch_size=REGISTRATION_BATCH_SIZE, flush_interval=REGISTRATION_FLUSH_INTERVAL):
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.totals = {'inserted': 0, 'duplicates': 0, 'invalid': 0}
+
+    def start(self):
+        """Démarre le thread d'écriture"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='registration-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval if self.flush_interval > 0 else None)
+            self._wake.clear()
+            self.flush()
+
+    def submit(self, row):
+        """Met une inscription en file, sans attendre l'écriture (appelable depuis la boucle d'événements)"""
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            # Le thread d'écriture s'en charge: la boucle d'événements n'est jamais bloquée
+            self._wake.set()
+
+    def pending(self):
+        """Nombre d'inscriptions en attente d'écriture"""
+        with self._lock:
+            return len(self._buffer)
+
+    def is_pending(self, mobile):
+        """Indique si une inscription pour ce numéro attend d'être écrite"""
+        with self._lock:
+            return any(row[1] == mobile for row in self._buffer)
+
+    def flush(self):
+        """Ajoute toutes les inscriptions en attente; retourne le rapport de add_drivers"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return None
+            try:
+                # Marquées 'bot': la synchronisation du fichier Excel ne les supprime pas
+                report = self.db.add_drivers(batch, source=SOURCE_BOT)
+            except Exception as e:
+                print(f"Erreur lors de l'enregistrement des inscriptions: {e}")
+                with self._lock:
+                    self._buffer[:0] = batch
+                return None
+            for key in self.totals:
+                self.totals[key] += report[key]
+            for line_number, error in report['errors']:
+                print(f"⚠️ Inscription refusée ({batch[line_number - 1][1]}): {error}")
+            if report['duplicates']:
+                print(f"⚠️ {report['duplicates']} inscription(s) ignorée(s): numéro déjà enregistré")
+            return report
+
+    def close(self):
+        """Arrête le thread et écrit les dernières inscriptions"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
@@ -0,0 +1,102 @@
+"""
+Rendu des messages du bot: menus précalculés et listes de résultats mises en cache
+"""
+
+import threading
+from config import MESSAGES, RENDER_CACHE_SIZE
+
+# Menus statiques construits une seule fois à l'import
+MAIN_MENU_TEXT = "\n".join([
+    MESSAGES['select_service'],
+    MESSAGES['looking_for_driver'],
+    MESSAGES['driver_registration'],
+    MESSAGES['exit'],
+])
+
+WELCOME_MENU = f"{MESSAGES['welcome']}\n\n{MAIN_MENU_TEXT}"
+
+CITY_MENU = "\n".join([
+    MESSAGES['select_city'],
+    MESSAGES['riyadh'],
+    MESSAGES['dammam'],
+])
+
+PICKUP_MENU = "\n".join([
+    MESSAGES['select_pickup_location'],
+    MESSAGES['east'],
+    MESSAGES['west'],
+    MESSAGES['south'],
+    MESSAGES['north'],
+    MESSAGES['city_center'],
+    MESSAGES['outside_city'],
+])
+
+DESTINATION_MENU = "\n".join([
+    MESSAGES['select_destination'],
+    MESSAGES['universities'],
+    MESSAGES['schools'],
+    MESSAGES['employees'],
+    MESSAGES['others'],
+])
+
+# Inscription d'un chauffeur: mêmes options que la recherche, choix multiples pour les zones et destinations
+REGISTRATION_START = f"{MESSAGES['registration_intro']}\n\n{MESSAGES['ask_name']}"
+
+REGISTRATION_AREAS_MENU = "\n".join([MESSAGES['select_areas']] + PICKUP_MENU.split("\n")[1:])
+
+REGISTRATION_DESTINATIONS_MENU = "\n".join([MESSAGES['select_destinations']] + DESTINATION_MENU.split("\n")[1:])
+
+REGISTRATION_DONE = f"{MESSAGES['registration_received']}\n\n{MAIN_MENU_TEXT}"
+
+# Numéro déjà enregistré: la mise à jour d'un profil passe par WhatsApp
+REGISTRATION_EXISTS = f"{MESSAGES['already_registered']}\n{MESSAGES['contact_whatsapp']}\n\n{MAIN_MENU_TEXT}"
+
+RESULTS_FOOTER = f"\n{MAIN_MENU_TEXT}"
+
+RESULTS_FOOTER_WITH_NEXT = f"{RESULTS_FOOTER}\n{MESSAGES['next_page']}"
+
+DRIVER_TEMPLATE = (
+    "{index}. اسم السائق: {0}\n"
+    "   رقم الجوال: {1}\n"
+    "   الجنسية: {2}\n"
+    "   نوع المركبة: {3}\n"
+    "   الرسوم الشهرية: {4} ريال\n\n"
+)
+
+def render_results(results, start=1, has_more=False):
+    """Construit le message d'une page de résultats suivi du menu principal"""
+    footer = RESULTS_FOOTER_WITH_NEXT if has_more else RESULTS_FOOTER
+    if not results:
+        return MESSAGES['no_results'] + footer
+
+    parts = [f"{MESSAGES['results_header']}\n\n"]
+    parts.extend(
+        DRIVER_TEMPLATE.format(*driver, index=index)
+        for index, driver in enumerate(results, start)
+    )
+    parts.append(footer)
+    return "".join(parts)
+
+class ResultsRenderer:
+    """Cache des pages de résultats déjà rendues, par filtres et position dans les résultats"""
+
+    def __init__(self, max_size=RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """Retourne (message, curseur suivant) si le catalogue n'a pas changé, sinon None"""
+        entry = self._pages.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return None
+
+    def render(self, key, version, results, next_cursor=None, start=1):
+        """Rend une page et la garde pour les prochaines demandes"""
+        page = (render_results(results, start, next_cursor is not None), next_cursor)
+        with self._lock:
+            if len(self._pages) >= self.max_size and key not in self._pages:
+                self._pages.clear()
+            self._pages[key] = (version, page)
+        return page
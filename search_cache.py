@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+from config import SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+
+class SearchCache:
+    """Cache borné (LRU + durée de vie) des résultats de recherche"""
+
+    def __init__(self, max_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retourne la valeur en cache ou None (entrée absente ou expirée)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, generation):
+        """Enregistre une valeur calculée pendant la génération donnée"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            # Résultat calculé avant une invalidation: on ne le garde pas
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Vide le cache après une modification des données"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Compteurs du cache pour le suivi d'exploitation"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
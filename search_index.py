@@ -0,0 +1,161 @@
+import heapq
+import threading
+from bisect import bisect_right
+from itertools import islice
+from config import RANKING_WEIGHTS
+
+# Modes de classement: une valeur plus petite est meilleure
+RANK_MODES = ('price', 'coverage', 'score')
+
+def rank_value(rank_by, price, coverage):
+    """Valeur de classement d'un chauffeur (prix mensuel et nombre de zones + destinations)"""
+    if rank_by == 'price':
+        return price
+    if rank_by == 'coverage':
+        return -coverage
+    if rank_by == 'score':
+        return price * RANKING_WEIGHTS['price'] - coverage * RANKING_WEIGHTS['coverage']
+    raise ValueError(f"Mode de classement inconnu: {rank_by}")
+
+def _bitset(positions, size):
+    """Construit un entier dont les bits aux positions données sont à 1"""
+    flags = bytearray((size + 7) // 8)
+    for position in positions:
+        flags[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(flags, 'little')
+
+class BitmapSearchIndex:
+    """Index en mémoire: un bitset (entier Python) par ville, zone et destination"""
+
+    def __init__(self):
+        # Version du catalogue (db_meta) reflétée par l'index
+        self.version = 0
+        self.ids = []
+        self.rows = []
+        self.cities = {}
+        self.areas = {}
+        self.destinations = {}
+        self.coverage = []
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, conn):
+        """Construit l'index à partir des tables drivers, driver_areas et driver_destinations"""
+        index = cls()
+        cities = {}
+        cursor = conn.execute('''
+            SELECT id, city, driver_name, mobile_contact, nationality, vehicle_type, monthly_price
+            FROM drivers ORDER BY id
+        ''')
+        for position, (driver_id, city, *row) in enumerate(cursor):
+            index.ids.append(driver_id)
+            index.rows.append(tuple(row))
+            index._positions[driver_id] = position
+            cities.setdefault(city, []).append(position)
+
+        areas = index._group_positions(conn.execute('SELECT driver_id, area FROM driver_areas'))
+        destinations = index._group_positions(
+            conn.execute('SELECT driver_id, destination FROM driver_destinations')
+        )
+
+        size = len(index.ids)
+        index.coverage = [0] * size
+        for groups in (areas, destinations):
+            for positions in groups.values():
+                for position in positions:
+                    index.coverage[position] += 1
+        index.cities = {value: _bitset(positions, size) for value, positions in cities.items()}
+        index.areas = {value: _bitset(positions, size) for value, positions in areas.items()}
+        index.destinations = {value: _bitset(positions, size) for value, positions in destinations.items()}
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _group_positions(self, pairs):
+        groups = {}
+        for driver_id, value in pairs:
+            position = self._positions.get(driver_id)
+            if position is not None:
+                groups.setdefault(value, []).append(position)
+        return groups
+
+    def _set_bit(self, bitsets, value, position):
+        bitsets[value] = bitsets.get(value, 0) | (1 << position)
+
+    def add(self, driver_id, row, city, areas, destinations):
+        """Ajoute un chauffeur; retourne False si l'identifiant n'est pas croissant"""
+        with self._lock:
+            if self.ids and driver_id <= self.ids[-1]:
+                return False
+            position = len(self.ids)
+            self.ids.append(driver_id)
+            self.rows.append(tuple(row))
+            self._positions[driver_id] = position
+            self.coverage.append(len(areas) + len(destinations))
+            self._set_bit(self.cities, city, position)
+            for area in areas:
+                self._set_bit(self.areas, area, position)
+            for destination in destinations:
+                self._set_bit(self.destinations, destination, position)
+            return True
+
+    def match(self, city=None, pickup_location=None, destination=None):
+        """Retourne le bitset des chauffeurs correspondant aux critères"""
+        with self._lock:
+            bits = (1 << len(self.ids)) - 1
+            if city:
+                bits &= self.cities.get(city, 0)
+            if pickup_location:
+                bits &= self.areas.get(pickup_location, 0)
+            if destination:
+                bits &= self.destinations.get(destination, 0)
+            return bits
+
+    def positions(self, bits):
+        """Positions des bits à 1, dans l'ordre croissant des identifiants"""
+        flags = bin(bits)[:1:-1]
+        position = flags.find('1')
+        while position != -1:
+            yield position
+            position = flags.find('1', position + 1)
+
+    def search(self, city=None, pickup_location=None, destination=None, after_id=None, limit=None,
+               rank_by=None, after_rank=None):
+        """Recherche par ET bit à bit; retourne des triplets (id, rang, ligne)
+
+        Sans rank_by les résultats suivent l'ordre des ids (rang None). Avec rank_by,
+        les meilleurs sont choisis par un tas (top-K) sans trier tous les résultats.
+        after_id (et after_rank en mode classé) permettent une pagination par curseur.
+        """
+        bits = self.match(city, pickup_location, destination)
+        ids = self.ids
+        rows = self.rows
+
+        if rank_by is None:
+            if after_id is not None:
+                start = bisect_right(ids, after_id)
+                bits = (bits >> start) << start
+            positions = self.positions(bits)
+            if limit is not None:
+                positions = islice(positions, limit)
+            return [(ids[position], None, rows[position]) for position in positions]
+
+        coverage = self.coverage
+        ranks = {}
+
+        def sort_key(position):
+            rank = rank_value(rank_by, rows[position][4], coverage[position])
+            ranks[position] = rank
+            return (rank, ids[position])
+
+        candidates = self.positions(bits)
+        if after_id is not None and after_rank is not None:
+            after = (after_rank, after_id)
+            candidates = (position for position in candidates if sort_key(position) > after)
+        if limit is not None:
+            chosen = heapq.nsmallest(limit, candidates, key=sort_key)
+        else:
+            chosen = sorted(candidates, key=sort_key)
+        return [(ids[position], ranks[position], rows[position]) for position in chosen]
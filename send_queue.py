@@ -0,0 +1,196 @@
+"""
+File d'envoi des messages sortants, cadencée selon les limites de Telegram
+"""
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from rate_limiter import TokenBucket
+from config import (SEND_GLOBAL_RATE, SEND_PER_CHAT_INTERVAL, SEND_WORKERS, SEND_MAX_RETRIES,
+                    SEND_DRAIN_TIMEOUT)
+
+# Voies de priorité: la plus petite valeur part en premier
+PRIORITY_REPLY = 0
+PRIORITY_NORMAL = 1
+PRIORITY_NOTICE = 2
+
+# Longueur maximale d'un message Telegram (messages regroupés)
+MAX_MESSAGE_LENGTH = 4096
+
+class _Outgoing:
+    __slots__ = ('priority', 'seq', 'chat_id', 'text', 'kwargs', 'futures', 'attempts')
+
+    def __init__(self, priority, seq, chat_id, text, kwargs, future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.futures = [future]
+        self.attempts = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def can_merge(self, other):
+        return (not self.kwargs and not other.kwargs
+                and len(self.text) + len(other.text) + 2 <= MAX_MESSAGE_LENGTH)
+
+class SendQueue:
+    """Envoie les messages en file, sans bloquer les gestionnaires
+
+    Chaque chat a sa propre file: un seul de ses messages est en cours d'envoi à la fois,
+    au plus un tous les per_chat_interval secondes, et les messages texte qui attendent
+    sont regroupés en un seul. Entre chats, la voie de priorité puis l'ordre d'arrivée
+    décident; le débit global est borné par un seau à jetons (global_rate messages/s).
+    Une erreur RetryAfter (429) suspend tous les envois le temps demandé.
+    """
+
+    def __init__(self, bot, global_rate=SEND_GLOBAL_RATE, per_chat_interval=SEND_PER_CHAT_INTERVAL,
+                 workers=SEND_WORKERS, max_retries=SEND_MAX_RETRIES):
+        self.bot = bot
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self.max_retries = max_retries
+        self._queue = None
+        self._bucket = None
+        self._tasks = []
+        self._seq = itertools.count()
+        # Files par chat; une entrée existe tant qu'un message du chat est en cours ou récent
+        self._chats = {}
+        self._paused_until = 0.0
+        self._pending = 0
+        self.sent = 0
+        self.merged = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    async def start(self):
+        """Démarre les tâches d'envoi"""
+        self._queue = asyncio.PriorityQueue()
+        self._bucket = TokenBucket(self.global_rate, self.global_rate, time.monotonic())
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout=SEND_DRAIN_TIMEOUT):
+        """Envoie ce qui reste (au plus timeout secondes) puis arrête les tâches"""
+        if not self._tasks:
+            return
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def send(self, chat_id, text, priority=PRIORITY_NORMAL, **kwargs):
+        """Met un message en file; retourne un Future résolu avec le Message envoyé (None en cas d'échec)"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending += 1
+        item = _Outgoing(priority, next(self._seq), chat_id, text, kwargs, future)
+        waiting = self._chats.get(chat_id)
+        if waiting is not None:
+            # Un message de ce chat est en cours: celui-ci partira à sa suite
+            waiting.append(item)
+        else:
+            self._chats[chat_id] = deque([item])
+            self._release(chat_id)
+        return future
+
+    def pending(self):
+        """Messages pas encore envoyés (ni abandonnés)"""
+        return self._pending
+
+    def stats(self):
+        return {
+            'pending': self._pending,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'chats': len(self._chats),
+            'sent': self.sent,
+            'merged': self.merged,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
+
+    def _release(self, chat_id):
+        """Passe le prochain message du chat (regroupé avec les textes qui le suivent) à la file globale"""
+        waiting = self._chats.get(chat_id)
+        if not waiting:
+            # Intervalle écoulé sans nouveau message
+            self._chats.pop(chat_id, None)
+            return
+        item = waiting.popleft()
+        while waiting and item.can_merge(waiting[0]):
+            following = waiting.popleft()
+            item.text = f"{item.text}\n\n{following.text}"
+            item.futures.extend(following.futures)
+            item.priority = min(item.priority, following.priority)
+            self.merged += 1
+        self._queue.put_nowait(item)
+
+    def _schedule(self, chat_id, delay):
+        asyncio.get_running_loop().call_later(delay, self._release, chat_id)
+
+    def _resolve(self, item, result=None, error=None):
+        self._pending -= len(item.futures)
+        if error is not None:
+            self.failed += 1
+            print(f"Erreur lors de l'envoi d'un message au chat {item.chat_id}: {error}")
+        for future in item.futures:
+            if not future.done():
+                future.set_result(result)
+
+    async def _acquire_global(self):
+        """Attend un jeton du débit global (et la fin d'une éventuelle suspension 429)"""
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if self._bucket.refill(now) >= 1:
+                self._bucket.tokens -= 1
+                return
+            await asyncio.sleep((1 - self._bucket.tokens) / self.global_rate)
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                delay = await self._deliver(item)
+            except Exception as e:
+                self._resolve(item, error=e)
+                delay = self.per_chat_interval
+            self._schedule(item.chat_id, delay)
+
+    async def _deliver(self, item):
+        """Envoie un message; retourne le délai avant le prochain envoi pour ce chat"""
+        await self._acquire_global()
+        item.attempts += 1
+        try:
+            message = await self.bot.send_message(item.chat_id, item.text, **item.kwargs)
+        except RetryAfter as e:
+            self.retried += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            self._chats[item.chat_id].appendleft(item)
+            return e.retry_after
+        except (BadRequest, Forbidden) as e:
+            # Chat bloqué ou message refusé: inutile de réessayer
+            self._resolve(item, error=e)
+            return self.per_chat_interval
+        except TelegramError as e:
+            if item.attempts > self.max_retries:
+                self._resolve(item, error=e)
+                return self.per_chat_interval
+            self.retried += 1
+            self._chats[item.chat_id].appendleft(item)
+            return self.per_chat_interval * 2 ** item.attempts
+        self.sent += 1
+        self._resolve(item, message)
+        return self.per_chat_interval
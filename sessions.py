@@ -0,0 +1,66 @@
+import random
+import sys
+import time
+from collections import OrderedDict
+
+def deep_sizeof(value, seen=None):
+    """Estimation de la mémoire occupée par un objet et son contenu (dict, list, ...)"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in value)
+    return size
+
+def estimate_mapping_size(mapping, sample):
+    """Mémoire estimée d'un dict d'entrées (ex: user_data) à partir d'au plus `sample` entrées"""
+    keys = list(mapping)
+    if not keys:
+        return sys.getsizeof(mapping)
+    measured = random.sample(keys, sample) if len(keys) > sample else keys
+    total = sum(deep_sizeof(key) + deep_sizeof(mapping[key]) for key in measured)
+    return sys.getsizeof(mapping) + total * len(keys) // len(measured)
+
+class SessionTracker:
+    """Dernière activité de chaque utilisateur, du plus ancien au plus récent"""
+
+    def __init__(self):
+        self._last_seen = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def touch(self, user_id, now=None):
+        """Enregistre une activité de l'utilisateur"""
+        self._last_seen[user_id] = time.monotonic() if now is None else now
+        self._last_seen.move_to_end(user_id)
+
+    def forget(self, user_id):
+        if self._last_seen.pop(user_id, None) is not None:
+            self.evicted += 1
+
+    def active(self, within, now=None):
+        """Nombre d'utilisateurs actifs depuis moins de `within` secondes"""
+        limit = (time.monotonic() if now is None else now) - within
+        count = 0
+        for last_seen in reversed(self._last_seen.values()):
+            if last_seen < limit:
+                break
+            count += 1
+        return count
+
+    def stale(self, ttl, max_entries, now=None):
+        """Utilisateurs inactifs depuis plus de ttl secondes, puis les plus anciens au-delà de max_entries"""
+        limit = (time.monotonic() if now is None else now) - ttl
+        overflow = max(0, len(self._last_seen) - max_entries)
+        stale = []
+        for user_id, last_seen in self._last_seen.items():
+            if last_seen >= limit and len(stale) >= overflow:
+                break
+            stale.append(user_id)
+        return stale
@@ -5,8 +5,13 @@ Script de test pour le bot Telegram
 
 import os
 import sys
+import asyncio
+import json
 from database import DriverDatabase
+from async_database import AsyncDriverDatabase
 from config import MESSAGES, CITIES, PICKUP_LOCATIONS, DESTINATIONS
+from driver_import import DRIVER_COLUMNS
+from rendering import WELCOME_MENU, CITY_MENU, ResultsRenderer, render_results
 
 def test_database():
     """Test de la base de données"""
@@ -43,6 +48,29 @@ def test_database():
     
     results = db.search_drivers(destination='Universities')
     print(f"Résultats pour Universities: {len(results)} chauffeurs trouvés")
+    
+    # Correspondance exacte: 'City' ne doit pas trouver 'City Center' ni 'Outside City'
+    assert db.search_drivers(pickup_location='City') == []
+    print("✅ Correspondance exacte des zones")
+
+def test_connection_pool():
+    """Test du pool de connexions"""
+    print("\n🧪 Test du pool de connexions...")
+    
+    db = DriverDatabase()
+    
+    with db.pool.connection() as conn:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        # Une connexion imbriquée dans le même thread est réutilisée
+        with db.pool.connection() as nested:
+            assert nested is conn
+    print(f"✅ Mode journal: {mode}")
+    
+    with db.pool.connection() as again:
+        assert again is conn
+    print("✅ Connexion réutilisée entre deux appels")
+    
+    db.close()
 
 def test_config():
     """Test de la configuration"""
@@ -75,6 +103,8 @@ def test_messages():
     welcome_msg += f"{MESSAGES['driver_registration']}\n"
     welcome_msg += f"{MESSAGES['exit']}"
     
+    assert welcome_msg == WELCOME_MENU
+    
     print("Message de bienvenue:")
     print(welcome_msg)
     print(f"Longueur: {len(welcome_msg)} caractères")
@@ -84,8 +114,19 @@ def test_messages():
     city_msg += f"{MESSAGES['riyadh']}\n"
     city_msg += f"{MESSAGES['dammam']}"
     
+    assert city_msg == CITY_MENU
+    
     print("\nMessage de sélection de ville:")
     print(city_msg)
+    
+    # Les résultats rendus sont mis en cache par filtres et version du catalogue
+    renderer = ResultsRenderer()
+    results = [('أحمد محمد', '0501234567', 'Saudi', 'Sedan', 1500.0)]
+    page = renderer.render(('Riyadh', 'East', 'Universities'), 0, results, {'after_id': 1})
+    assert page[0] == render_results(results, has_more=True)
+    assert MESSAGES['next_page'] in page[0]
+    assert renderer.get(('Riyadh', 'East', 'Universities'), 0) is page
+    assert renderer.get(('Riyadh', 'East', 'Universities'), 1) is None
 
 def test_search_flow():
     """Test du flux de recherche"""
@@ -118,6 +159,896 @@ def test_search_flow():
         print(f"  Type de véhicule: {driver[3]}")
         print(f"  Prix mensuel: {driver[4]} ريال")
 
+def test_incremental_sync():
+    """Test de la synchronisation incrémentale depuis Excel"""
+    print("\n🧪 Test de la synchronisation incrémentale...")
+    import tempfile
+    import pandas as pd
+    
+    db = DriverDatabase()
+    df = pd.read_excel(db.excel_path, dtype={'mobile_contact': str})
+    db.load_from_excel()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db.excel_path = os.path.join(tmp, 'drivers_data.xlsx')
+        
+        # Une mise à jour, une suppression et un ajout
+        changed = df.copy()
+        changed.loc[0, 'monthly_price'] = 999.0
+        changed = changed.drop(index=1)
+        new_driver = changed.iloc[[0]].copy()
+        new_driver['mobile_contact'] = '0599999999'
+        changed = pd.concat([changed, new_driver], ignore_index=True)
+        changed.to_excel(db.excel_path, index=False)
+        
+        report = db.load_from_excel()
+        assert report['updated'] == 1
+        assert report['deleted'] == 1
+        assert report['inserted'] == 1
+        assert report['unchanged'] == len(df) - 2
+        assert db.search_drivers() == [row[2:] for row in db._search_drivers_sql()]
+        print(f"✅ Synchronisation: {report}")
+        
+        # Le même contenu en CSV ne change rien
+        csv_path = os.path.join(tmp, 'drivers_data.csv')
+        changed.to_csv(csv_path, index=False)
+        report = db.load_from_excel(csv_path)
+        assert report['unchanged'] == len(changed)
+        
+        # Rechargement du fichier d'origine
+        df.to_excel(db.excel_path, index=False)
+        db.load_from_excel()
+    
+    db.close()
+
+def test_sync_concurrent_writer():
+    """Test d'une synchronisation pendant qu'un autre écrivain valide des transactions"""
+    print("\n🧪 Test de la synchronisation avec un écrivain concurrent...")
+    import sqlite3
+    import tempfile
+    import threading
+    import time
+    from utils.synthetic_data import generate_drivers, write_csv
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DriverDatabase(os.path.join(tmp, 'sync.db'))
+        catalog = os.path.join(tmp, 'drivers.csv')
+        rows = list(generate_drivers(5000, seed=2))
+        write_csv(catalog, rows)
+        db.load_from_excel(catalog)
+        rows[-1] = ('Test',) + rows[-1][1:]
+        write_csv(catalog, rows)
+        
+        # Autre connexion (ex: journal des accès) qui écrit pendant que le fichier est relu
+        stop = threading.Event()
+        def writer():
+            conn = sqlite3.connect(db.db_path, timeout=30)
+            while not stop.is_set():
+                with conn:
+                    conn.execute("INSERT INTO user_access_log (user_id, username, action) VALUES (1, 'u', 'x')")
+                time.sleep(0.001)  # comme un écrivain réel, qui ne garde pas le verrou en continu
+            conn.close()
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            report = db.load_from_excel(catalog)
+        finally:
+            stop.set()
+            thread.join()
+        assert report and report['updated'] == 1
+        db.close()
+    print("✅ Synchronisation validée malgré les écritures concurrentes")
+
+def test_reload_hashes_once():
+    """Test du rechargement conditionnel: le fichier n'est haché qu'une fois"""
+    print("\n🧪 Test du hachage unique du fichier au rechargement...")
+    import glob
+    import tempfile
+    from utils.synthetic_data import generate_drivers, write_csv
+    
+    leftovers = set(glob.glob(os.path.join(tempfile.gettempdir(), 'drivers_sync_*')))
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DriverDatabase(os.path.join(tmp, 'hash.db'))
+        catalog = os.path.join(tmp, 'drivers.csv')
+        rows = list(generate_drivers(200, seed=3))
+        write_csv(catalog, rows)
+        db.load_from_excel(catalog)
+        
+        hashes = []
+        signature = db._file_signature
+        def counting_signature(path, with_hash=True):
+            if with_hash:
+                hashes.append(path)
+            return signature(path, with_hash)
+        db._file_signature = counting_signature
+        
+        # Même contenu réécrit (date modifiée): une seule empreinte, rien n'est relu
+        os.utime(catalog, ns=(0, 0))
+        report = db.load_from_excel(catalog, only_if_changed=True)
+        assert report['source_unchanged'] and len(hashes) == 1
+        
+        # Contenu modifié: une seule empreinte, réutilisée pour la synchronisation
+        hashes.clear()
+        rows[0] = ('Test',) + rows[0][1:]
+        write_csv(catalog, rows)
+        report = db.load_from_excel(catalog, only_if_changed=True)
+        assert not report['source_unchanged'] and report['updated'] == 1 and len(hashes) == 1
+        db.close()
+    
+    # La base temporaire de synchronisation est supprimée
+    assert set(glob.glob(os.path.join(tempfile.gettempdir(), 'drivers_sync_*'))) <= leftovers
+    print("✅ Fichier haché une seule fois")
+
+def test_skip_unchanged_reload():
+    """Test du saut du rechargement quand le fichier Excel n'a pas changé"""
+    print("\n🧪 Test du rechargement conditionnel...")
+    
+    db = DriverDatabase()
+    db.load_from_excel()
+    assert db.source_unchanged()
+    
+    report = db.load_from_excel(only_if_changed=True)
+    assert report['source_unchanged']
+    print("✅ Rechargement ignoré pour un fichier inchangé")
+    
+    db.close()
+
+def test_search_index():
+    """Test de l'index bitmap en mémoire"""
+    print("\n🧪 Test de l'index de recherche...")
+    
+    db = DriverDatabase()
+    assert db.search_index is not None
+    
+    # L'index doit renvoyer exactement les mêmes résultats que SQL
+    for city in CITIES.values():
+        for pickup in PICKUP_LOCATIONS.values():
+            for destination in DESTINATIONS.values():
+                expected = [row[2:] for row in db._search_drivers_sql(city, pickup, destination)]
+                assert db.search_drivers(city, pickup, destination) == expected
+    print(f"✅ Index cohérent avec SQL ({len(db.search_index)} chauffeurs indexés)")
+    
+    db.close()
+
+def test_catalog_version():
+    """Test de la détection des écritures externes (autre instance) et d'un index périmé"""
+    print("\n🧪 Test de la version du catalogue...")
+    import tempfile
+    from search_index import BitmapSearchIndex
+    
+    row = ('Test', '0500000011', 'Riyadh', 'East, North', 1500.0, 'Sedan', 'Saudi', 'Schools')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'catalog.db')
+        bot_db, other_db = DriverDatabase(path), DriverDatabase(path)
+        assert bot_db.search_drivers('Riyadh', 'East', 'Schools') == []
+        
+        # Écriture par une autre instance: cache vidé et index reconstruit, sans intervention
+        other_db.add_drivers([row])
+        bot_db.check_catalog(force=True)
+        assert bot_db.search_drivers('Riyadh', 'East', 'Schools') == [('Test', '0500000011', 'Saudi', 'Sedan', 1500.0)]
+        assert bot_db.search_index.version == bot_db.get_meta('catalog_version')
+        
+        # Reconstruction concurrente installée après un ajout: l'index périmé est écarté
+        with bot_db.pool.connection() as conn:
+            stale = BitmapSearchIndex.build(conn)
+            stale.version = bot_db._read_catalog_version(conn)
+        bot_db.add_drivers([row[:1] + ('0500000012',) + row[2:]])
+        bot_db.search_index = stale
+        assert len(bot_db.search_drivers('Riyadh', 'North', 'Schools')) == 2
+        assert bot_db.search_index is not stale and len(bot_db.search_index) == 2
+        bot_db.close()
+        other_db.close()
+    print("✅ Écritures externes visibles, index périmé reconstruit")
+
+def test_pagination():
+    """Test de la pagination par curseur"""
+    print("\n🧪 Test de la pagination...")
+    
+    db = DriverDatabase()
+    expected = db.search_drivers(city='Riyadh')
+    
+    # Même découpage avec l'index en mémoire puis avec SQL
+    for use_index in (True, False):
+        if not use_index:
+            db.search_index = None
+            db.search_cache.invalidate()
+        pages = []
+        cursor = {}
+        while cursor is not None:
+            page, cursor = db.search_drivers_page(city='Riyadh', limit=3, **cursor)
+            assert len(page) <= 3
+            pages.append(page)
+        assert [driver for page in pages for driver in page] == expected
+    print(f"✅ {len(expected)} chauffeurs répartis sur {len(pages)} pages")
+    
+    db.close()
+
+def test_ranking():
+    """Test du classement des résultats (top-K)"""
+    print("\n🧪 Test du classement...")
+    
+    db = DriverDatabase()
+    cheapest = db.top_drivers(k=3, rank_by='price')
+    assert [driver[4] for driver in cheapest] == sorted(driver[4] for driver in db.search_drivers())[:3]
+    
+    # Index en mémoire et SQL donnent le même ordre, page par page
+    for rank_by in ('price', 'coverage', 'score'):
+        ranked = db.search_drivers(rank_by=rank_by)
+        sql = [row[2:] for row in db._search_drivers_sql(rank_by=rank_by)]
+        assert ranked == sql
+        
+        pages = []
+        cursor = {}
+        while cursor is not None:
+            page, cursor = db.search_drivers_page(limit=3, rank_by=rank_by, **cursor)
+            pages.extend(page)
+        assert pages == ranked
+    print(f"✅ Top 3 par prix: {[driver[4] for driver in cheapest]}")
+    
+    db.close()
+
+def test_search_cache():
+    """Test du cache des résultats de recherche"""
+    print("\n🧪 Test du cache de recherche...")
+    
+    db = DriverDatabase()
+    first = db.search_drivers('Riyadh', 'East', 'Universities')
+    second = db.search_drivers('Riyadh', 'East', 'Universities')
+    assert first == second
+    stats = db.get_cache_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    
+    # Toute modification du catalogue invalide le cache
+    db._catalog_changed()
+    assert db.get_cache_stats()['size'] == 0
+    print(f"✅ Cache: {stats}")
+    
+    db.close()
+
+def test_async_database():
+    """Test de la façade asynchrone"""
+    print("\n🧪 Test de la base de données asynchrone...")
+    
+    db = DriverDatabase()
+    expected = (db.search_drivers(city='Riyadh'), db.search_drivers(city='Dammam'))
+    
+    async def run_searches():
+        async_db = AsyncDriverDatabase(db)
+        try:
+            results = await asyncio.gather(
+                async_db.search_drivers(city='Riyadh'),
+                async_db.search_drivers(city='Dammam'),
+            )
+        finally:
+            await async_db.close()
+        return results
+    
+    riyadh, dammam = asyncio.run(run_searches())
+    assert (riyadh, dammam) == expected
+    print(f"✅ Recherches asynchrones: {len(riyadh)} + {len(dammam)} chauffeurs")
+
+def test_access_log():
+    """Test du journal des accès différé"""
+    print("\n🧪 Test du journal des accès...")
+    
+    db = DriverDatabase()
+    with db.pool.connection() as conn:
+        before = conn.execute("SELECT COUNT(*) FROM user_access_log").fetchone()[0]
+    
+    for action in ("start", "search_driver", "exit"):
+        db.log_user_access(42, "test_user", action)
+    assert db.access_log.pending() == 3
+    
+    db.close()
+    assert db.access_log.pending() == 0
+    
+    db = DriverDatabase()
+    with db.pool.connection() as conn:
+        after = conn.execute("SELECT COUNT(*) FROM user_access_log").fetchone()[0]
+    db.close()
+    assert after - before == 3
+    print("✅ Accès écrits par lot à la fermeture")
+
+def test_webhook_server():
+    """Test du serveur HTTP du webhook avec de fausses mises à jour"""
+    print("\n🧪 Test du serveur webhook...")
+    from http_server import HttpServer
+    from utils.fake_update_poster import build_message_update, post_update
+    
+    received = []
+    
+    async def on_update(body, headers):
+        received.append(json.loads(body))
+        return 200, 'text/plain', b''
+    
+    async def run_server():
+        server = HttpServer('127.0.0.1', 0)
+        server.add_route('POST', '/telegram', on_update)
+        await server.start()
+        url = f"http://127.0.0.1:{server.port}/telegram"
+        loop = asyncio.get_running_loop()
+        try:
+            statuses = [
+                await loop.run_in_executor(None, post_update, url, build_message_update(i, 7, text), None)
+                for i, text in enumerate(['/start', '1'], 1)
+            ]
+            missing = await loop.run_in_executor(None, post_update, url + '/x', {}, None)
+            # En-tête Content-Length invalide: réponse 400, pas d'exception dans le serveur
+            invalid = []
+            for length in (b'abc', b'-1'):
+                reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+                writer.write(b'POST /telegram HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n')
+                await writer.drain()
+                invalid.append((await reader.readline()).split()[1])
+                writer.close()
+        finally:
+            await server.stop()
+        return statuses, missing, invalid
+    
+    statuses, missing, invalid = asyncio.run(run_server())
+    assert statuses == [200, 200] and missing == 404 and invalid == [b'400', b'400']
+    assert [update['message']['text'] for update in received] == ['/start', '1']
+    print(f"✅ {len(received)} mises à jour reçues par le webhook")
+
+def test_webhook_payloads():
+    """Test des corps de requête invalides reçus par le webhook"""
+    print("\n🧪 Test des mises à jour invalides du webhook...")
+    import tempfile
+    from utils.fake_update_poster import build_message_update
+    from utils.load_test import FakeTelegramRequest, LOAD_TEST_TOKEN
+    from bot_handler import TelegramBot
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DriverDatabase(os.path.join(tmp, 'webhook.db'))
+        bot = TelegramBot(db, request=FakeTelegramRequest(), token=LOAD_TEST_TOKEN, metrics=False, watch_interval=0)
+        bodies = [b'[1]', b'"x"', b'null', b'{}', b'{"update_id": 1, "message": "x"}', b'{"message": {}}', b'{',
+                  json.dumps(build_message_update(1, 7, '/start')).encode()]
+        
+        async def post_all():
+            return [(await bot.handle_webhook_update(body, {}))[0] for body in bodies]
+        
+        statuses = asyncio.run(post_all())
+        assert statuses == [400] * (len(bodies) - 1) + [200]
+        assert bot.application.update_queue.qsize() == 1
+        db.close()
+    print("✅ Corps invalides refusés (400), mise à jour valide placée dans la file")
+
+def test_update_processor():
+    """Test du traitement concurrent avec ordre conservé par chat"""
+    print("\n🧪 Test du traitement concurrent des mises à jour...")
+    from telegram import Update
+    from update_processor import PerChatUpdateProcessor
+    from utils.fake_update_poster import build_message_update
+    
+    events = []
+    
+    async def handle(name, delay):
+        events.append(('start', name))
+        await asyncio.sleep(delay)
+        events.append(('end', name))
+    
+    async def run_updates():
+        processor = PerChatUpdateProcessor(max_in_flight=4)
+        async with processor:
+            updates = [
+                (Update.de_json(build_message_update(1, 1, 'a'), None), 'a1', 0.05),
+                (Update.de_json(build_message_update(2, 1, 'b'), None), 'a2', 0.0),
+                (Update.de_json(build_message_update(3, 2, 'c'), None), 'b1', 0.0),
+            ]
+            await asyncio.gather(*[
+                processor.process_update(update, handle(name, delay)) for update, name, delay in updates
+            ])
+            assert processor.active_chats() == 0
+    
+    async def flood():
+        # Le chat 1 envoie 10 mises à jour: au-delà de 3 en attente elles sont écartées
+        processor = PerChatUpdateProcessor(max_in_flight=4, max_pending=8, max_pending_per_chat=3)
+        async with processor:
+            flooding = [
+                processor.process_update(Update.de_json(build_message_update(i, 1, 'x'), None), handle(f'f{i}', 0.05))
+                for i in range(10)
+            ]
+            await asyncio.sleep(0.01)
+            other = processor.process_update(Update.de_json(build_message_update(99, 2, 'y'), None),
+                                             handle('other', 0.0))
+            await asyncio.wait_for(asyncio.gather(*flooding, other), 1)
+        return processor.dropped
+    
+    asyncio.run(run_updates())
+    # Le chat 2 n'attend pas le chat 1, et le chat 1 reste dans l'ordre
+    assert events.index(('end', 'b1')) < events.index(('end', 'a1'))
+    assert events.index(('end', 'a1')) < events.index(('start', 'a2'))
+    print("✅ Ordre par chat conservé, chats différents en parallèle")
+    
+    events.clear()
+    dropped = asyncio.run(flood())
+    assert dropped == 7 and ('end', 'other') in events
+    assert events.index(('end', 'other')) < events.index(('end', 'f0'))
+    print(f"✅ {dropped} mises à jour d'un chat qui inonde le bot écartées, les autres chats servis")
+
+def test_persistence():
+    """Test de la persistance des conversations"""
+    print("\n🧪 Test de la persistance...")
+    from persistence import SQLitePersistence, encode_user_data, decode_user_data
+    
+    user_data = {
+        'search_filters': {'city': 'Riyadh', 'pickup_location': 'East'},
+        'search_cursor': {'after_id': 12, 'after_rank': 1500.0},
+        'search_offset': 5,
+    }
+    payload = encode_user_data(user_data)
+    assert decode_user_data(payload) == user_data
+    print(f"✅ user_data encodé en {len(payload)} octets: {payload}")
+    
+    db = DriverDatabase()
+    
+    async def save_and_reload():
+        persistence = SQLitePersistence(db.pool)
+        await persistence.update_user_data(42, user_data)
+        await persistence.update_conversation('driver_search', (42, 42), 3)
+        await persistence.update_conversation('driver_search', (43, 43), 1)
+        await persistence.update_conversation('driver_search', (43, 43), None)
+        await persistence.flush()
+        
+        reloaded = SQLitePersistence(db.pool)
+        return await reloaded.get_user_data(), await reloaded.get_conversations('driver_search')
+    
+    users, conversations = asyncio.run(save_and_reload())
+    assert users[42] == user_data
+    assert conversations[(42, 42)] == 3 and (43, 43) not in conversations
+    print("✅ Conversations et filtres rechargés")
+    
+    db.close()
+
+def test_session_expiry():
+    """Test de l'expiration des données des utilisateurs inactifs"""
+    print("\n🧪 Test de l'expiration des sessions...")
+    from sessions import SessionTracker, deep_sizeof, estimate_mapping_size
+    
+    tracker = SessionTracker()
+    for user_id in range(1, 6):
+        tracker.touch(user_id, now=100.0 + user_id)
+    tracker.touch(1, now=200.0)
+    
+    # Inactifs depuis plus de 50s à t=160: 2 à 5; l'utilisateur 1 vient de revenir
+    assert tracker.stale(ttl=50, max_entries=100, now=160.0) == [2, 3, 4, 5]
+    # Au plus 3 utilisateurs gardés: les 2 moins récents partent même s'ils sont actifs
+    assert tracker.stale(ttl=1000, max_entries=3, now=160.0) == [2, 3]
+    assert tracker.active(within=10, now=201.0) == 1
+    
+    for user_id in tracker.stale(ttl=50, max_entries=100, now=160.0):
+        tracker.forget(user_id)
+    assert len(tracker) == 1 and tracker.evicted == 4
+    print("✅ Utilisateurs inactifs et en surnombre expirés")
+    
+    small = deep_sizeof({'search_filters': {}})
+    large = deep_sizeof({'search_filters': {'city': 'Riyadh', 'destination': 'King Saud University'}})
+    assert large > small > 0
+    print(f"✅ Mémoire estimée: {small} -> {large} octets")
+    
+    # Estimation par échantillon: coût borné, exacte pour des entrées de même taille
+    entries = {user_id: {'search_filters': {'city': 'Riyadh'}} for user_id in range(1000)}
+    per_entry = deep_sizeof(0) + deep_sizeof({'search_filters': {'city': 'Riyadh'}})
+    assert estimate_mapping_size(entries, 50) == sys.getsizeof(entries) + 1000 * per_entry
+    
+    from bot_handler import TelegramBot
+    from metrics import REGISTRY
+    from utils.load_test import FakeTelegramRequest, LOAD_TEST_TOKEN
+    bot = TelegramBot(DriverDatabase(), request=FakeTelegramRequest(), token=LOAD_TEST_TOKEN)
+    assert bot.open_conversations() == {}
+    assert 'bot_user_data_bytes ' in REGISTRY.render()
+    bot.db.close()
+    print("✅ Mémoire de user_data exportée sur /metrics")
+
+def test_rate_limiter():
+    """Test de la limitation de débit"""
+    print("\n🧪 Test de la limitation de débit...")
+    from rate_limiter import RateLimiter
+    
+    limiter = RateLimiter(user_rate=1.0, user_burst=3, global_rate=1.0, global_burst=4,
+                          notice_interval=10.0, max_users=3)
+    limiter._global.updated = 0.0
+    
+    # Réserve de 3 messages, puis 1 par seconde
+    assert [limiter.allow(1, now=0.0) for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow(1, now=1.0)
+    # Réserve globale de 4 jetons rechargée à 1/s: épuisée, elle bloque aussi les autres
+    assert limiter.allow(2, now=1.0)
+    assert not limiter.allow(3, now=1.0)
+    assert limiter.allow(3, now=2.0)
+    print("✅ Réserves par utilisateur et globale respectées")
+    
+    assert limiter.should_notify(1, now=1.0)
+    assert not limiter.should_notify(1, now=5.0)
+    assert limiter.should_notify(1, now=11.0)
+    print("✅ Un seul avertissement par intervalle")
+    
+    limiter.allow(4, now=3.0)
+    assert limiter.stats()['tracked_users'] == 3 and 1 not in limiter._users
+    print(f"✅ Statistiques: {limiter.stats()}")
+
+def test_send_queue():
+    """Test de la file d'envoi des messages"""
+    print("\n🧪 Test de la file d'envoi...")
+    from telegram.error import RetryAfter
+    from send_queue import SendQueue, PRIORITY_REPLY, PRIORITY_NOTICE
+    
+    class FakeBot:
+        def __init__(self):
+            self.sent = []
+            self.flood = {4}
+        
+        async def send_message(self, chat_id, text, **kwargs):
+            if chat_id in self.flood:
+                self.flood.discard(chat_id)
+                raise RetryAfter(0)
+            self.sent.append((chat_id, text))
+            return len(self.sent)
+    
+    async def scenario():
+        bot = FakeBot()
+        queue = SendQueue(bot, global_rate=1000.0, per_chat_interval=0.05, workers=1, max_retries=1)
+        await queue.start()
+        # Même tour de boucle: la réponse passe avant l'avertissement d'un autre chat
+        queue.send(2, 'notice', PRIORITY_NOTICE)
+        queue.send(3, 'reply', PRIORITY_REPLY)
+        first = queue.send(1, 'a')
+        queue.send(1, 'b')
+        last = queue.send(1, 'c')
+        queue.send(4, 'flood')
+        results = await asyncio.gather(first, last)
+        await queue.stop(timeout=2.0)
+        return bot.sent, results, queue.stats()
+    
+    sent, results, stats = asyncio.run(scenario())
+    assert sent[0] == (3, 'reply') and sent[1] == (1, 'a')
+    # Les messages en attente d'un même chat sont regroupés, dans l'ordre
+    assert (1, 'b\n\nc') in sent and (4, 'flood') in sent
+    assert results[0] != results[1] and results[1] is not None
+    assert stats['pending'] == 0 and stats['merged'] == 1 and stats['retried'] == 1 and stats['failed'] == 0
+    print(f"✅ Priorités, ordre par chat, regroupement et 429 gérés: {stats}")
+
+def test_metrics():
+    """Test des métriques et de l'export Prometheus"""
+    print("\n🧪 Test des métriques...")
+    import urllib.request
+    from http_server import HttpServer
+    from metrics import MetricsRegistry, observe_handler, HANDLER_SECONDS, DB_SECONDS
+    from async_database import AsyncDriverDatabase
+    
+    registry = MetricsRegistry()
+    requests_total = registry.counter('test_requests_total', 'Requêtes')
+    latency = registry.histogram('test_latency_seconds', 'Durée', buckets=(0.1, 1.0))
+    registry.gauge('test_queue_depth', 'File', lambda: 3)
+    requests_total.inc(handler='a')
+    requests_total.inc(2, handler='a')
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5.0)
+    
+    text = registry.render()
+    assert 'test_requests_total{handler="a"} 3' in text
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count 3' in text and 'test_queue_depth 3' in text
+    print("✅ Format texte Prometheus correct")
+    
+    @observe_handler
+    async def sample_handler():
+        return 'ok'
+    
+    async def metrics_page(body, headers):
+        return 200, 'text/plain; version=0.0.4', registry.render().encode('utf-8')
+    
+    db = AsyncDriverDatabase()
+    
+    async def serve():
+        await sample_handler()
+        await db.search_drivers('Riyadh')
+        server = HttpServer('127.0.0.1', 0)
+        server.add_route('GET', '/metrics', metrics_page)
+        await server.start()
+        try:
+            url = f"http://127.0.0.1:{server.port}/metrics"
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, lambda: urllib.request.urlopen(url).read().decode('utf-8'))
+        finally:
+            await server.stop()
+            await db.close()
+    
+    served = asyncio.run(serve())
+    assert served == registry.render()
+    assert HANDLER_SECONDS.count(handler='sample_handler') == 1
+    assert DB_SECONDS.count(method='search_drivers') >= 1
+    print("✅ Durées des gestionnaires et des appels à la base mesurées, /metrics servi")
+
+def test_load_harness():
+    """Test du parcours complet à travers le ConversationHandler, API Telegram simulée"""
+    print("\n🧪 Test de charge réduit...")
+    from utils.load_test import run_load_test, FLOW_STEPS
+    
+    report = asyncio.run(run_load_test(users=10, concurrency=5, drivers=100))
+    # Chaque utilisateur reçoit une liste de résultats: ville, zone et destination sont bien enchaînées
+    assert report['completed_users'] == 10
+    assert all(report['states'][step]['count'] == 10 for step in FLOW_STEPS)
+    print(f"✅ {report['updates']} mises à jour traitées ({report['updates_per_s']:.0f}/s)")
+
+def test_benchmark_suite():
+    """Test du benchmark sur un petit catalogue synthétique"""
+    print("\n🧪 Test du benchmark...")
+    from utils.benchmark import run_benchmarks, parse_size
+    
+    assert parse_size('1k') == 1000 and parse_size('1m') == 1000000 and parse_size('250') == 250
+    report = run_benchmarks([300], adds=5, accesses=50)
+    result = report['results'][0]
+    assert result['load_initial']['inserted'] == 300 and result['load_unchanged']['unchanged'] == 300
+    assert result['search_drivers']['count'] == 48 and result['add_driver']['count'] == 5
+    assert json.loads(json.dumps(report)) == report
+    print(f"✅ Recherche p50: {result['search_drivers']['p50_ms']} ms")
+
+def test_bulk_add_drivers():
+    """Test de l'ajout groupé de chauffeurs avec validation et dédoublonnage"""
+    print("\n🧪 Test de l'ajout groupé...")
+    import tempfile
+    from utils.synthetic_data import generate_drivers
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DriverDatabase(os.path.join(tmp, 'bulk.db'))
+        rows = list(generate_drivers(250, seed=3))
+        rows.append(rows[0])  # doublon dans le lot
+        rows.append(('Test', '0500000001', 'Jeddah', 'East', 1500.0, 'Sedan', 'Saudi', 'Schools'))
+        rows.append({'driver_name': 'Test', 'mobile_contact': '0500000002', 'city': 'Riyadh',
+                     'area_of_support': ['East', 'North'], 'monthly_price': '1600', 'vehicle_type': 'Van',
+                     'nationality': 'Saudi', 'delivery_classification': ['Schools']})
+        
+        report = db.add_drivers(rows, batch_size=40, transaction_size=100)
+        assert report['inserted'] == 251 and report['duplicates'] == 1 and report['invalid'] == 1
+        assert report['errors'] == [(252, 'ville inconnue: Jeddah')]
+        # Déjà en base: ignorés au second passage
+        again = db.add_drivers(rows[:10])
+        assert again['inserted'] == 0 and again['duplicates'] == 10
+        print(f"✅ {report['inserted']} ajoutés, doublons et lignes invalides écartés")
+        
+        # Index en mémoire et tables de jonction à jour
+        for city in CITIES.values():
+            for pickup in PICKUP_LOCATIONS.values():
+                expected = [row[2:] for row in db._search_drivers_sql(city, pickup, 'Schools')]
+                assert db.search_drivers(city, pickup, 'Schools') == expected
+        assert ('Test', '0500000002', 'Saudi', 'Van', 1600.0) in db.search_drivers('Riyadh', 'North', 'Schools')
+        print("✅ Recherches cohérentes après l'ajout groupé")
+        db.close()
+        
+        # Chauffeurs importés conservés par la synchronisation du fichier Excel
+        from utils.synthetic_data import write_csv
+        db = DriverDatabase(os.path.join(tmp, 'sync.db'))
+        catalog = os.path.join(tmp, 'drivers.csv')
+        excel_rows = list(generate_drivers(20, seed=4, mobile_prefix='07'))
+        write_csv(catalog, excel_rows)
+        db.load_from_excel(catalog)
+        assert db.add_drivers(rows[:10])['inserted'] == 10
+        write_csv(catalog, excel_rows[1:] + list(generate_drivers(1, seed=9, mobile_prefix='08')))
+        report = db.load_from_excel(catalog, only_if_changed=True)
+        assert report['inserted'] == 1 and report['deleted'] == 1
+        mobiles = {driver[2] for driver in db.get_all_drivers()}
+        assert {row[1] for row in rows[:10]} <= mobiles and excel_rows[0][1] not in mobiles
+        db.close()
+        print("✅ Synchronisation Excel: seuls les chauffeurs du fichier sont supprimés")
+        
+        # JSON Lines synchronisé: zones et destinations en listes, trouvées par la recherche
+        jsonl = os.path.join(tmp, 'drivers.jsonl')
+        with open(jsonl, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'driver_name': 'Test', 'mobile_contact': '0500000003', 'city': 'Dammam',
+                                'area_of_support': ['East', 'North'], 'monthly_price': 1400,
+                                'vehicle_type': 'Sedan', 'nationality': 'Saudi',
+                                'delivery_classification': ['Universities']}) + '\n')
+        db = DriverDatabase(os.path.join(tmp, 'jsonl.db'))
+        assert db.load_from_excel(jsonl)['inserted'] == 1
+        assert db.search_drivers('Dammam', 'North', 'Universities') == [('Test', '0500000003', 'Saudi', 'Sedan', 1400.0)]
+        db.close()
+        print("✅ Fichier JSON Lines synchronisé avec zones et destinations en listes")
+
+def test_bulk_add_concurrent_writer():
+    """Test de l'ajout groupé pendant qu'un autre processus ajoute des chauffeurs"""
+    print("\n🧪 Test de l'ajout groupé avec un écrivain concurrent...")
+    import sqlite3
+    import tempfile
+    import threading
+    import time
+    from utils.synthetic_data import generate_drivers
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DriverDatabase(os.path.join(tmp, 'bulk.db'))
+        stop = threading.Event()
+        def writer():
+            conn = sqlite3.connect(db.db_path, timeout=30)
+            for row in generate_drivers(100000, seed=5, mobile_prefix='09'):
+                if stop.is_set():
+                    break
+                with conn:
+                    conn.execute(f"INSERT INTO drivers ({', '.join(DRIVER_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+                time.sleep(0.0005)
+            conn.close()
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            # Petits lots: de nombreuses fenêtres où l'autre processus peut écrire
+            report = db.add_drivers(generate_drivers(3000, seed=3), batch_size=10, transaction_size=10)
+        finally:
+            stop.set()
+            thread.join()
+        assert report['inserted'] == 3000
+        # Liens créés pour les chauffeurs ajoutés, pas pour ceux de l'autre processus
+        with db.pool.connection() as conn:
+            linked = conn.execute('SELECT COUNT(DISTINCT driver_id) FROM driver_areas').fetchone()[0]
+        assert linked == 3000
+        db.close()
+    print("✅ Ajout groupé correct malgré les écritures concurrentes")
+
+def test_next_page_state():
+    """Test de la page suivante: acceptée seulement juste après des résultats"""
+    print("\n🧪 Test de la page suivante après une nouvelle recherche...")
+    import itertools
+    import tempfile
+    from telegram import Update
+    from utils.fake_update_poster import build_message_update
+    from utils.load_test import FakeTelegramRequest, LOAD_TEST_TOKEN
+    from utils.synthetic_data import generate_drivers, write_csv
+    from bot_handler import TelegramBot
+    from rate_limiter import RateLimiter
+    
+    async def scenario(db):
+        request = FakeTelegramRequest()
+        bot = TelegramBot(db, request=request, token=LOAD_TEST_TOKEN, metrics=False, watch_interval=0)
+        bot.rate_limiter = RateLimiter(1e9, 1e9, 1e9, 1e9, 0, 10)
+        bot.send_queue.per_chat_interval = 0
+        application = bot.application
+        update_ids = itertools.count(1)
+        await application.initialize()
+        await bot.on_startup(application)
+        await application.start()
+        await bot.send_queue.stop()  # réponses envoyées directement, une à une
+        replies = []
+        try:
+            # Recherche, page suivante, nouvelle recherche abandonnée puis '4' depuis le menu
+            for text in ['/start', '1', '1', '1', '1', '4', '1', '/start', '4']:
+                before = len(request.messages.get(5151, []))
+                update = Update.de_json(build_message_update(next(update_ids), 5151, text), application.bot)
+                await application.process_update(update)
+                replies.append(request.messages.get(5151, [])[before:])
+        finally:
+            await application.stop()
+            await bot.on_stop(application)
+            await application.shutdown()
+            await bot.on_shutdown(application)
+        return replies
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DriverDatabase(os.path.join(tmp, 'paging.db'))
+        catalog = os.path.join(tmp, 'drivers.csv')
+        write_csv(catalog, generate_drivers(3000, seed=7))
+        db.load_from_excel(catalog)
+        replies = asyncio.run(scenario(db))
+        db.close()
+    
+    assert MESSAGES['next_page'] in replies[4][0]
+    assert replies[5] and replies[5][0] != replies[4][0]
+    # Curseur oublié: aucune page (non filtrée) envoyée
+    assert replies[7] == [WELCOME_MENU] and replies[8] == []
+    print("✅ Page suivante refusée hors des résultats")
+
+def test_registration_flow():
+    """Test de l'inscription d'un chauffeur depuis le bot, écrite en différé par lots"""
+    print("\n🧪 Test de l'inscription des chauffeurs...")
+    import itertools
+    import tempfile
+    from telegram import Update
+    from utils.fake_update_poster import build_message_update
+    from utils.load_test import FakeTelegramRequest, LOAD_TEST_TOKEN
+    from bot_handler import TelegramBot, parse_choices, parse_price
+    from rate_limiter import RateLimiter
+    
+    assert parse_choices('1, 5،2 1', PICKUP_LOCATIONS) == ['East', 'City Center', 'West']
+    assert parse_choices('1 9', PICKUP_LOCATIONS) is None
+    assert parse_price(' 1,800 ') == parse_price('١٬٨٠٠') == 1800.0 and parse_price('1500.5') == 1500.5
+    assert parse_price('1,5') is None and parse_price('18,00') is None and parse_price('abc') is None
+    
+    async def scenario(db):
+        request = FakeTelegramRequest()
+        bot = TelegramBot(db, request=request, token=LOAD_TEST_TOKEN, metrics=False, watch_interval=0)
+        bot.registrations.flush_interval = 60  # écriture uniquement à la fermeture
+        bot.rate_limiter = RateLimiter(1e9, 1e9, 1e9, 1e9, 0, 10)
+        bot.send_queue.per_chat_interval = 0
+        application = bot.application
+        update_ids = itertools.count(1)
+        await application.initialize()
+        await bot.on_startup(application)
+        await application.start()
+        try:
+            texts = ['/start', '2', 'A', 'سالم أحمد', '12', '+966 50 123 4567', '1',
+                     '1 9', '2,5', '2', 'Van', 'Saudi', 'abc', '1,800']
+            duplicate = ['/start', '2', 'علي سالم', '+966-501234567']
+            for user_id, user_texts in ((4242, texts), (4343, duplicate)):
+                for text in user_texts:
+                    update = Update.de_json(build_message_update(next(update_ids), user_id, text), application.bot)
+                    await application.process_update(update)
+            # Inscription en file, pas encore visible dans la base; même numéro refusé
+            assert bot.registrations.pending() == 1
+            assert db.search_drivers('Riyadh', 'West', 'Schools') == []
+            
+            # Numéro déjà en base après l'écriture du lot: renvoi vers WhatsApp, pas de doublon
+            bot.registrations.flush()
+            for text in duplicate:
+                update = Update.de_json(build_message_update(next(update_ids), 4444, text), application.bot)
+                await application.process_update(update)
+            assert bot.registrations.pending() == 0
+        finally:
+            await application.stop()
+            await bot.on_stop(application)
+            await application.shutdown()
+            await bot.on_shutdown(application)
+        return request.messages, bot.registrations.totals
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DriverDatabase(os.path.join(tmp, 'registration.db'))
+        messages, totals = asyncio.run(scenario(db))
+        for key in ('invalid_name', 'invalid_phone', 'invalid_option', 'invalid_price', 'registration_received'):
+            assert any(MESSAGES[key] in text for text in messages[4242]), key
+        for user_id in (4343, 4444):
+            assert MESSAGES['contact_whatsapp'] in messages[user_id][-1]
+        assert totals['inserted'] == 1 and totals['duplicates'] == 0
+        
+        db = DriverDatabase(os.path.join(tmp, 'registration.db'))
+        expected = ('سالم أحمد', '+966501234567', 'Saudi', 'Van', 1800.0)
+        assert db.search_drivers('Riyadh', 'City Center', 'Schools') == [expected]
+        assert db.search_drivers('Riyadh', 'East', 'Schools') == []
+        print("✅ Chauffeur inscrit, écrit à la fermeture et trouvé par la recherche")
+        
+        # Rechargement du fichier Excel modifié: le chauffeur inscrit depuis le bot reste
+        from utils.synthetic_data import generate_drivers, write_xlsx
+        workbook = os.path.join(tmp, 'drivers.xlsx')
+        write_xlsx(workbook, generate_drivers(20, seed=6, mobile_prefix='07'))
+        db.load_from_excel(workbook)
+        write_xlsx(workbook, generate_drivers(21, seed=6, mobile_prefix='07'))
+        report = db.load_from_excel(workbook, only_if_changed=True)
+        assert report['inserted'] == 1 and report['deleted'] == 0
+        assert expected in db.search_drivers('Riyadh', 'City Center', 'Schools')
+        db.close()
+    print("✅ Inscription conservée après le rechargement du fichier Excel")
+
+def test_statistics():
+    """Test des statistiques agrégées par SQL, comparées à un décompte ligne par ligne"""
+    print("\n🧪 Test des statistiques...")
+    import tempfile
+    from collections import Counter
+    from utils.synthetic_data import generate_drivers
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DriverDatabase(os.path.join(tmp, 'stats.db'))
+        assert db.get_statistics()['total'] == 0
+        rows = list(generate_drivers(500, seed=5))
+        db.add_drivers(rows)
+        stats = db.get_statistics(price_bucket=500)
+        
+        assert stats['total'] == 500
+        assert stats['cities'] == dict(Counter(row[2] for row in rows))
+        assert stats['vehicle_types'] == dict(Counter(row[5] for row in rows))
+        assert stats['nationalities'] == dict(Counter(row[6] for row in rows))
+        assert list(stats['vehicle_types'].values()) == sorted(stats['vehicle_types'].values(), reverse=True)
+        assert stats['price_histogram'] == dict(Counter(int(row[4] // 500) * 500 for row in rows))
+        riyadh = [row[4] for row in rows if row[2] == 'Riyadh']
+        assert stats['prices']['Riyadh']['min'] == min(riyadh) and stats['prices']['Riyadh']['max'] == max(riyadh)
+        
+        areas = Counter((row[2], area) for row in rows for area in row[3].split(', '))
+        assert stats['area_coverage']['Dammam']['North'] == areas[('Dammam', 'North')]
+        destinations = Counter(d for row in rows for d in row[7].split(', '))
+        assert stats['destination_coverage'] == dict(destinations)
+        
+        db_async = AsyncDriverDatabase(db)
+        assert asyncio.run(db_async.get_statistics()) == db.get_statistics()
+        asyncio.run(db_async.close())
+    print(f"✅ {len(stats['price_histogram'])} tranches de prix, couverture par zone et destination")
+
 def main():
     """Fonction principale de test"""
     print("🚀 Démarrage des tests du bot Telegram")
@@ -125,9 +1056,36 @@ def main():
     
     try:
         test_config()
+        test_connection_pool()
         test_database()
         test_messages()
         test_search_flow()
+        test_incremental_sync()
+        test_sync_concurrent_writer()
+        test_reload_hashes_once()
+        test_skip_unchanged_reload()
+        test_search_index()
+        test_catalog_version()
+        test_pagination()
+        test_ranking()
+        test_search_cache()
+        test_async_database()
+        test_access_log()
+        test_webhook_server()
+        test_webhook_payloads()
+        test_update_processor()
+        test_persistence()
+        test_session_expiry()
+        test_rate_limiter()
+        test_send_queue()
+        test_metrics()
+        test_load_harness()
+        test_benchmark_suite()
+        test_bulk_add_drivers()
+        test_bulk_add_concurrent_writer()
+        test_next_page_state()
+        test_registration_flow()
+        test_statistics()
         
         print("\n✅ Tous les tests sont passés avec succès!")
         print("\n📋 Résumé:")
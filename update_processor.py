@@ -0,0 +1,69 @@
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from config import UPDATE_CONCURRENCY, UPDATE_MAX_PENDING, UPDATE_MAX_PENDING_PER_CHAT
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Traite les mises à jour de chats différents en parallèle, et celles d'un même chat dans l'ordre
+
+    max_in_flight borne le nombre de gestionnaires exécutés en même temps (protection de la
+    base de données); max_pending borne les mises à jour en cours ou en attente (au-delà,
+    la lecture des mises à jour attend qu'une place se libère). max_pending_per_chat borne
+    la part d'un seul chat: ses mises à jour suivantes sont écartées sans attendre son verrou.
+    """
+
+    def __init__(self, max_in_flight=UPDATE_CONCURRENCY, max_pending=UPDATE_MAX_PENDING,
+                 max_pending_per_chat=UPDATE_MAX_PENDING_PER_CHAT):
+        super().__init__(max_concurrent_updates=max(max_pending, max_in_flight))
+        self.max_in_flight = max_in_flight
+        self.max_pending_per_chat = max(1, max_pending_per_chat)
+        self.dropped = 0
+        self._in_flight = None
+        self._chat_locks = {}
+
+    async def initialize(self):
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._chat_locks = {}
+
+    async def shutdown(self):
+        self._chat_locks.clear()
+
+    @staticmethod
+    def chat_key(update):
+        """Clé de sérialisation: le chat, à défaut l'utilisateur"""
+        if isinstance(update, Update):
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+            if update.effective_user is not None:
+                return ('user', update.effective_user.id)
+        return None
+
+    def active_chats(self):
+        """Nombre de chats ayant au moins une mise à jour en cours ou en attente"""
+        return len(self._chat_locks)
+
+    async def do_process_update(self, update, coroutine):
+        key = self.chat_key(update)
+        if key is None:
+            async with self._in_flight:
+                await coroutine
+            return
+
+        # Verrou par chat partagé tant que des mises à jour de ce chat sont en cours
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+        elif entry[1] >= self.max_pending_per_chat:
+            # Chat qui inonde le bot: la mise à jour est écartée et libère sa place tout de suite
+            self.dropped += 1
+            coroutine.close()
+            return
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._in_flight:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[key]
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de DriverDatabase sur des catalogues synthétiques (1k, 100k, 1M chauffeurs):
+import, 48 recherches, ajout de chauffeurs et journal des accès; résultats en JSON
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import itertools
+import json
+import platform
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+from config import CITIES, PICKUP_LOCATIONS, DESTINATIONS, RESULTS_PAGE_SIZE
+from database import DriverDatabase
+from utils.load_test import percentile
+from utils.synthetic_data import generate_drivers, write_csv, write_xlsx
+
+DEFAULT_SIZES = '1k,100k,1m'
+
+def parse_size(value):
+    """'1k' -> 1000, '1m' -> 1000000"""
+    value = value.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+def summarize(durations):
+    """Statistiques d'une série de durées (secondes)"""
+    durations = sorted(durations)
+    total = sum(durations)
+    return {
+        'count': len(durations),
+        'total_s': round(total, 6),
+        'mean_ms': round(total / len(durations) * 1000, 4) if durations else 0.0,
+        'p50_ms': round(percentile(durations, 50) * 1000, 4),
+        'p95_ms': round(percentile(durations, 95) * 1000, 4),
+        'max_ms': round(durations[-1] * 1000, 4) if durations else 0.0,
+    }
+
+def timed(func, *args, **kwargs):
+    """Exécute func; retourne (durée en secondes, résultat)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def search_combinations():
+    """Les 48 combinaisons ville x zone x destination des menus du bot"""
+    return list(itertools.product(CITIES.values(), PICKUP_LOCATIONS.values(), DESTINATIONS.values()))
+
+def bench_size(size, file_format, workdir, adds, accesses, seed):
+    """Tous les benchmarks pour un catalogue de `size` chauffeurs"""
+    result = {'drivers': size, 'format': file_format}
+    catalog = os.path.join(workdir, f'drivers_{size}.{file_format}')
+    writer = write_xlsx if file_format == 'xlsx' else write_csv
+    elapsed, _ = timed(writer, catalog, generate_drivers(size, seed))
+    result['generate_s'] = round(elapsed, 3)
+    result['file_bytes'] = os.path.getsize(catalog)
+
+    db = DriverDatabase(os.path.join(workdir, f'bench_{size}.db'))
+    try:
+        elapsed, report = timed(db.load_from_excel, catalog)
+        if not report:
+            raise RuntimeError(f"échec de l'import de {catalog}")
+        result['load_initial'] = {'seconds': round(elapsed, 3), 'rows_per_s': round(size / elapsed),
+                                  'inserted': report['inserted']}
+        # Même fichier relu en entier: uniquement des comparaisons, aucune écriture
+        elapsed, report = timed(db.load_from_excel, catalog)
+        result['load_unchanged'] = {'seconds': round(elapsed, 3), 'rows_per_s': round(size / elapsed),
+                                    'unchanged': report['unchanged']}
+        elapsed, report = timed(db.load_from_excel, catalog, only_if_changed=True)
+        result['load_skipped'] = {'seconds': round(elapsed, 4), 'source_unchanged': report['source_unchanged']}
+
+        combos = search_combinations()
+        durations, matches = [], []
+        for city, pickup, destination in combos:
+            elapsed, rows = timed(db.search_drivers, city, pickup, destination)
+            durations.append(elapsed)
+            matches.append(len(rows))
+        result['search_drivers'] = dict(summarize(durations), mean_results=round(sum(matches) / len(matches), 1))
+
+        elapsed, _ = timed(db.get_statistics)
+        result['statistics_s'] = round(elapsed, 4)
+
+        # Première page, cache vidé puis servie par le cache
+        db.search_cache.invalidate()
+        cold = [timed(db.search_drivers_page, *combo, limit=RESULTS_PAGE_SIZE)[0] for combo in combos]
+        warm = [timed(db.search_drivers_page, *combo, limit=RESULTS_PAGE_SIZE)[0] for combo in combos]
+        result['search_page_cold'] = summarize(cold)
+        result['search_page_cached'] = summarize(warm)
+
+        # Préfixe différent: numéros absents du catalogue
+        new_drivers = list(generate_drivers(adds, seed + 1, mobile_prefix='06'))
+        durations = [timed(db.add_driver, row)[0] for row in new_drivers]
+        result['add_driver'] = summarize(durations)
+
+        durations = [timed(db.log_user_access, 1000 + i % 500, f'user{i % 500}', 'search_driver')[0]
+                     for i in range(accesses)]
+        flush_elapsed, _ = timed(db.flush_access_log)
+        result['log_user_access'] = dict(summarize(durations), flush_s=round(flush_elapsed, 4))
+    finally:
+        db.close()
+    return result
+
+def run_benchmarks(sizes, file_format='csv', adds=200, accesses=10000, seed=0):
+    """Lance les benchmarks pour chaque taille; retourne le rapport complet"""
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'seed': seed,
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            print(f"⏱️ Catalogue de {size} chauffeurs ({file_format})...", file=sys.stderr)
+            result = bench_size(size, file_format, workdir, adds, accesses, seed)
+            print(f"   import {result['load_initial']['seconds']}s, "
+                  f"recherche p50 {result['search_drivers']['p50_ms']}ms, "
+                  f"ajout p50 {result['add_driver']['p50_ms']}ms", file=sys.stderr)
+            report['results'].append(result)
+    return report
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Tailles des catalogues, ex: 1k,100k,1m")
+    parser.add_argument('--format', choices=('csv', 'xlsx'), default='csv', help="Format du fichier importé")
+    parser.add_argument('--adds', type=int, default=200, help="Nombre d'appels à add_driver")
+    parser.add_argument('--accesses', type=int, default=10000, help="Nombre d'appels à log_user_access")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='-', help="Fichier JSON de sortie ('-' pour la sortie standard)")
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    report = run_benchmarks(sizes, args.format, args.adds, args.accesses, args.seed)
+    payload = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(payload)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload + '\n')
+        print(f"✅ Résultats écrits dans {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
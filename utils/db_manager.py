@@ -7,9 +7,11 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import pandas as pd
+import urllib.error
+import urllib.request
 from database import DriverDatabase
-from config import EXCEL_FILE_PATH
+from driver_import import iter_driver_rows, iter_csv_stream, iter_jsonl_stream
+from config import EXCEL_FILE_PATH, METRICS_LISTEN, METRICS_PORT
 
 class DatabaseManager:
     def __init__(self):
@@ -17,6 +19,8 @@ class DatabaseManager:
     
     def create_sample_data(self):
         """Crée des données d'exemple dans le fichier Excel"""
+        import pandas as pd
+        
         sample_data = {
             'driver_name': [
                 'أحمد محمد علي',
@@ -80,16 +84,37 @@ class DatabaseManager:
         df.to_excel(EXCEL_FILE_PATH, index=False)
         print(f"✅ Données d'exemple créées dans {EXCEL_FILE_PATH}")
     
-    def load_data_to_db(self):
-        """Charge les données Excel dans la base de données"""
+    def load_data_to_db(self, path=None):
+        """Charge les données (Excel, CSV ou Parquet) dans la base de données par lots"""
         try:
-            if self.db.load_from_excel():
+            report = self.db.load_from_excel(path)
+            if report:
                 print("✅ Données chargées avec succès dans la base de données")
+                print(f"   Insérées: {report['inserted']}, mises à jour: {report['updated']}, "
+                      f"supprimées: {report['deleted']}, inchangées: {report['unchanged']}, "
+                      f"ignorées: {report['skipped']}")
             else:
                 print("❌ Erreur lors du chargement des données")
         except Exception as e:
             print(f"❌ Erreur: {e}")
     
+    def import_drivers(self, source, file_format=None):
+        """Ajoute des chauffeurs depuis un fichier ou l'entrée standard ('-'), en CSV ou JSONL"""
+        try:
+            if source == '-':
+                reader = iter_csv_stream if file_format == 'csv' else iter_jsonl_stream
+                rows = reader(sys.stdin)
+            else:
+                rows = iter_driver_rows(source)
+            report = self.db.add_drivers(rows)
+        except Exception as e:
+            print(f"❌ Erreur: {e}")
+            return
+        print(f"✅ Chauffeurs ajoutés: {report['inserted']}, déjà présents: {report['duplicates']}, "
+              f"invalides: {report['invalid']}")
+        for line_number, error in report['errors']:
+            print(f"   Ligne {line_number}: {error}")
+    
     def show_all_drivers(self):
         """Affiche tous les chauffeurs dans la base de données"""
         drivers = self.db.get_all_drivers()
@@ -114,47 +139,64 @@ class DatabaseManager:
     
     def show_statistics(self):
         """Affiche les statistiques de la base de données"""
-        drivers = self.db.get_all_drivers()
-        if drivers:
-            cities = {}
-            vehicle_types = {}
-            nationalities = {}
-            
-            for driver in drivers:
-                city = driver[3]
-                vehicle_type = driver[6]
-                nationality = driver[7]
-                
-                cities[city] = cities.get(city, 0) + 1
-                vehicle_types[vehicle_type] = vehicle_types.get(vehicle_type, 0) + 1
-                nationalities[nationality] = nationalities.get(nationality, 0) + 1
-            
-            print("\n📊 Statistiques de la base de données:")
-            print("-" * 40)
-            print(f"Total des chauffeurs: {len(drivers)}")
-            print("\nPar ville:")
-            for city, count in cities.items():
-                print(f"  {city}: {count}")
-            print("\nPar type de véhicule:")
-            for vehicle, count in vehicle_types.items():
-                print(f"  {vehicle}: {count}")
-            print("\nPar nationalité:")
-            for nationality, count in nationalities.items():
-                print(f"  {nationality}: {count}")
-        else:
+        stats = self.db.get_statistics()
+        if not stats['total']:
             print("📭 Aucune donnée disponible pour les statistiques")
+            return
+        
+        print("\n📊 Statistiques de la base de données:")
+        print("-" * 40)
+        print(f"Total des chauffeurs: {stats['total']}")
+        print("\nPar ville:")
+        for city, count in stats['cities'].items():
+            prices = stats['prices'][city]
+            print(f"  {city}: {count} (prix {prices['min']:.0f}-{prices['max']:.0f}, moyenne {prices['avg']:.0f})")
+        print("\nPar type de véhicule:")
+        for vehicle, count in stats['vehicle_types'].items():
+            print(f"  {vehicle}: {count}")
+        print("\nPar nationalité:")
+        for nationality, count in stats['nationalities'].items():
+            print(f"  {nationality}: {count}")
+        
+        print("\nPrix mensuels:")
+        largest = max(stats['price_histogram'].values())
+        for low, count in stats['price_histogram'].items():
+            bar = '█' * max(1, round(count / largest * 30))
+            print(f"  {low:>6.0f}-{low + stats['price_bucket']:<6.0f} {bar} {count}")
+        print("\nCouverture des zones:")
+        for city, areas in stats['area_coverage'].items():
+            print(f"  {city}: " + ", ".join(f"{area} {count}" for area, count in areas.items()))
+        print("\nCouverture des destinations:")
+        for destination, count in stats['destination_coverage'].items():
+            print(f"  {destination}: {count}")
+
+def dump_metrics(url=None):
+    """Affiche les métriques exportées par le bot en cours d'exécution"""
+    url = url or f"http://{METRICS_LISTEN}:{METRICS_PORT}/metrics"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            print(response.read().decode('utf-8'), end='')
+    except (urllib.error.URLError, OSError) as e:
+        print(f"❌ Métriques indisponibles sur {url} (le bot est-il démarré?): {e}")
 
 def main():
     """Fonction principale du gestionnaire de base de données"""
+    # Lecture des métriques du bot: pas besoin d'ouvrir la base de données
+    if sys.argv[1:2] == ["metrics"]:
+        dump_metrics(sys.argv[2] if len(sys.argv) > 2 else None)
+        return
+    
     manager = DatabaseManager()
     
     if len(sys.argv) < 2:
         print("Utilisation:")
         print("  python db_manager.py create_sample  # Créer des données d'exemple")
-        print("  python db_manager.py load_data      # Charger les données dans la DB")
+        print("  python db_manager.py load_data [fichier]  # Charger les données dans la DB (.xlsx/.csv/.jsonl/.parquet)")
+        print("  python db_manager.py import fichier|- [csv|jsonl]  # Ajouter des chauffeurs (conservés par load_data)")
         print("  python db_manager.py show_all       # Afficher tous les chauffeurs")
         print("  python db_manager.py stats          # Afficher les statistiques")
         print("  python db_manager.py search         # Rechercher des chauffeurs")
+        print("  python db_manager.py metrics [url]  # Afficher les métriques du bot en cours d'exécution")
         return
     
     command = sys.argv[1]
@@ -162,7 +204,12 @@ def main():
     if command == "create_sample":
         manager.create_sample_data()
     elif command == "load_data":
-        manager.load_data_to_db()
+        manager.load_data_to_db(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif command == "import":
+        if len(sys.argv) < 3:
+            print("❌ Fichier manquant (ou '-' pour l'entrée standard)")
+            return
+        manager.import_drivers(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
     elif command == "show_all":
         manager.show_all_drivers()
     elif command == "stats":
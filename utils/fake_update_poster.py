@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Envoie de fausses mises à jour Telegram au webhook local (RUN_MODE=webhook) pour le tester
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from config import WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+
+# Parcours complet: menu, recherche, ville, zone, destination
+SEARCH_FLOW = ['/start', '1', '1', '1', '1']
+
+def build_message_update(update_id, user_id, text):
+    """Construit une mise à jour Telegram contenant un message texte"""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'Test', 'username': f'user{user_id}'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+def post_update(url, update, secret=WEBHOOK_SECRET, timeout=10):
+    """Envoie une mise à jour au webhook; retourne le code HTTP"""
+    request = urllib.request.Request(url, data=json.dumps(update).encode('utf-8'), method='POST')
+    request.add_header('Content-Type', 'application/json')
+    if secret:
+        request.add_header('X-Telegram-Bot-Api-Secret-Token', secret)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def run_user(url, user_id, first_update_id, secret):
+    """Envoie le parcours de recherche d'un utilisateur, dans l'ordre"""
+    statuses = []
+    for offset, text in enumerate(SEARCH_FLOW):
+        statuses.append(post_update(url, build_message_update(first_update_id + offset, user_id, text), secret))
+    return statuses
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--url', default=f"http://{WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument('--users', type=int, default=10, help="Nombre d'utilisateurs simulés")
+    parser.add_argument('--concurrency', type=int, default=10, help="Utilisateurs envoyant en parallèle")
+    parser.add_argument('--secret', default=WEBHOOK_SECRET)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [
+            executor.submit(run_user, args.url, 100000 + user, user * len(SEARCH_FLOW) + 1, args.secret)
+            for user in range(args.users)
+        ]
+        statuses = [status for future in futures for status in future.result()]
+    elapsed = time.perf_counter() - start
+
+    counts = {}
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+    print(f"📨 {len(statuses)} mises à jour envoyées en {elapsed:.2f}s ({len(statuses) / elapsed:.0f}/s)")
+    for status, count in sorted(counts.items()):
+        print(f"  HTTP {status}: {count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Test de charge: des utilisateurs simulés parcourent la recherche de chauffeurs à travers le vrai
+ConversationHandler du bot, avec une API Telegram simulée (aucun accès réseau)
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import tempfile
+import time
+from telegram import Update
+from telegram.request import BaseRequest
+from bot_handler import TelegramBot
+from config import CITIES, PICKUP_LOCATIONS, DESTINATIONS, MESSAGES
+from database import DriverDatabase
+from rate_limiter import RateLimiter
+from utils.fake_update_poster import build_message_update
+from utils.synthetic_data import generate_drivers, write_csv
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'load_test_bot'}
+# Jeton factice: l'API étant simulée, aucun vrai bot n'est nécessaire
+LOAD_TEST_TOKEN = '1:load-test'
+
+# Étapes du parcours, dans l'ordre: chaque mise à jour est mesurée sous le nom de l'état qui la reçoit
+FLOW_STEPS = ('start', 'main_menu', 'select_city', 'select_pickup', 'select_destination', 'next_page')
+
+class FakeTelegramRequest(BaseRequest):
+    """API Telegram simulée: répond localement à getMe, sendMessage, etc."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.messages = {}
+        self._message_ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        api_method = url.rsplit('/', 1)[-1]
+        parameters = request_data.parameters if request_data is not None else {}
+        if api_method == 'getMe':
+            result = BOT_USER
+        elif api_method == 'sendMessage':
+            chat_id = int(parameters['chat_id'])
+            self.messages.setdefault(chat_id, []).append(parameters['text'])
+            result = {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': parameters['text'],
+            }
+        elif api_method == 'getUpdates':
+            result = []
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
+
+def percentile(sorted_values, q):
+    """Percentile (rang le plus proche) d'une liste triée"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+def user_flow(rng):
+    """Messages d'un utilisateur: menu, recherche, ville, zone, destination, page suivante"""
+    return [
+        '/start', '1', rng.choice(list(CITIES)), rng.choice(list(PICKUP_LOCATIONS)),
+        rng.choice(list(DESTINATIONS)), '4',
+    ]
+
+async def run_user(application, user_id, texts, update_ids, latencies):
+    """Envoie le parcours d'un utilisateur, chaque message après la réponse au précédent"""
+    for step, text in zip(FLOW_STEPS, texts):
+        update = Update.de_json(build_message_update(next(update_ids), user_id, text), application.bot)
+        start = time.perf_counter()
+        # Même chemin que les mises à jour reçues: processeur concurrent puis gestionnaires
+        await application.update_processor.process_update(update, application.process_update(update))
+        latencies[step].append(time.perf_counter() - start)
+
+async def run_load_test(users=100, concurrency=50, drivers=1000, latency=0.0, seed=0, paced=False):
+    """Lance le test de charge; retourne le rapport (débit et latences par état)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DriverDatabase(os.path.join(tmp, 'load_test.db'))
+        catalog = os.path.join(tmp, 'drivers.csv')
+        write_csv(catalog, generate_drivers(drivers, seed))
+        db.load_from_excel(catalog)
+
+        request = FakeTelegramRequest(latency)
+        # Ni serveur de métriques (port fixe), ni surveillance du vrai fichier Excel
+        bot = TelegramBot(db, request=request, token=LOAD_TEST_TOKEN, metrics=False, watch_interval=0)
+        # Utilisateurs simulés: ni limitation de débit, ni cadence de Telegram (sauf --paced)
+        bot.rate_limiter = RateLimiter(1e9, 1e9, 1e9, 1e9, 0, users)
+        if not paced:
+            bot.send_queue.global_rate = 1e9
+            bot.send_queue.per_chat_interval = 0
+        application = bot.application
+
+        rng = random.Random(seed)
+        flows = [user_flow(rng) for _ in range(users)]
+        update_ids = itertools.count(1)
+        latencies = {step: [] for step in FLOW_STEPS}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(user_id, texts):
+            async with semaphore:
+                await run_user(application, user_id, texts, update_ids, latencies)
+
+        await application.initialize()
+        try:
+            await bot.on_startup(application)
+            await application.start()
+            start = time.perf_counter()
+            await asyncio.gather(*(limited(100000 + i, texts) for i, texts in enumerate(flows)))
+            elapsed = time.perf_counter() - start
+        finally:
+            if application.running:
+                await application.stop()
+            await bot.on_stop(application)
+            await application.shutdown()
+            await bot.on_shutdown(application)
+
+    # Un utilisateur a abouti s'il a reçu une liste de résultats (éventuellement vide)
+    completed = sum(
+        1 for i in range(users)
+        if any(MESSAGES['results_header'] in text or MESSAGES['no_results'] in text
+               for text in request.messages.get(100000 + i, []))
+    )
+    total = sum(len(values) for values in latencies.values())
+    report = {
+        'users': users,
+        'concurrency': concurrency,
+        'drivers': drivers,
+        'api_latency_ms': latency * 1000,
+        'updates': total,
+        'completed_users': completed,
+        'api_calls': request.calls,
+        'elapsed_s': round(elapsed, 3),
+        'updates_per_s': round(total / elapsed, 1) if elapsed else 0.0,
+        'states': {},
+    }
+    for step, values in latencies.items():
+        values.sort()
+        report['states'][step] = {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 50) * 1000, 3),
+            'p95_ms': round(percentile(values, 95) * 1000, 3),
+            'p99_ms': round(percentile(values, 99) * 1000, 3),
+        }
+    return report
+
+def print_report(report):
+    """Affiche le rapport sous forme de tableau"""
+    print(f"👥 {report['users']} utilisateurs ({report['concurrency']} en parallèle), "
+          f"{report['drivers']} chauffeurs")
+    print(f"📨 {report['updates']} mises à jour en {report['elapsed_s']:.2f}s "
+          f"({report['updates_per_s']:.0f}/s), {report['completed_users']} parcours aboutis")
+    print(f"{'état':<20}{'nombre':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step, stats in report['states'].items():
+        print(f"{step:<20}{stats['count']:>8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--users', type=int, default=200, help="Nombre d'utilisateurs simulés")
+    parser.add_argument('--concurrency', type=int, default=50, help="Utilisateurs actifs en même temps")
+    parser.add_argument('--drivers', type=int, default=1000, help="Taille du catalogue synthétique")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="Latence simulée de l'API (secondes)")
+    parser.add_argument('--paced', action='store_true', help="Garder la cadence d'envoi de Telegram")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Écrit aussi le rapport dans ce fichier JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args.users, args.concurrency, args.drivers, args.api_latency,
+                                       args.seed, args.paced))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
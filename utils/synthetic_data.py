@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Génération de catalogues de chauffeurs synthétiques (tests de charge et benchmarks)
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv
+import random
+from config import CITIES, PICKUP_LOCATIONS, DESTINATIONS
+from driver_import import DRIVER_COLUMNS
+
+FIRST_NAMES = ['أحمد', 'محمد', 'علي', 'خالد', 'فهد', 'سعد', 'يوسف', 'عبدالله', 'عبدالرحمن', 'عمر', 'حسن', 'ناصر']
+LAST_NAMES = ['محمد', 'علي', 'حسن', 'أحمد', 'عبدالله', 'خالد', 'سالم', 'إبراهيم']
+
+# Répartitions approximatives observées dans le fichier des chauffeurs
+CITY_WEIGHTS = {'Riyadh': 6, 'Dammam': 4}
+AREA_WEIGHTS = {'East': 4, 'West': 3, 'South': 2, 'North': 4, 'City Center': 5, 'Outside City': 1}
+DESTINATION_WEIGHTS = {'Universities': 4, 'Schools': 5, 'Employees': 3, 'Others': 1}
+VEHICLE_WEIGHTS = {'Sedan': 5, 'SUV': 3, 'Van': 2}
+NATIONALITY_WEIGHTS = {'Saudi': 5, 'Egyptian': 2, 'Pakistani': 2, 'Yemeni': 1, 'Sudanese': 1}
+
+def _weighted(weights, options):
+    """Poids dans l'ordre des options du menu (1 par défaut)"""
+    return list(options), [weights.get(option, 1) for option in options]
+
+def _sample(rng, options, weights, low, high):
+    """Entre low et high valeurs distinctes, tirées selon leurs poids"""
+    count = rng.randint(low, high)
+    chosen = []
+    while len(chosen) < count:
+        value = rng.choices(options, weights)[0]
+        if value not in chosen:
+            chosen.append(value)
+    return chosen
+
+def generate_drivers(count, seed=0, mobile_prefix='05'):
+    """Lignes de chauffeurs (ordre DRIVER_COLUMNS), numéros de mobile uniques pour un même préfixe"""
+    rng = random.Random(seed)
+    cities = _weighted(CITY_WEIGHTS, CITIES.values())
+    areas = _weighted(AREA_WEIGHTS, PICKUP_LOCATIONS.values())
+    destinations = _weighted(DESTINATION_WEIGHTS, DESTINATIONS.values())
+    vehicles = _weighted(VEHICLE_WEIGHTS, VEHICLE_WEIGHTS)
+    nationalities = _weighted(NATIONALITY_WEIGHTS, NATIONALITY_WEIGHTS)
+    for i in range(count):
+        # 7919 est premier avec 10**8: numéros distincts pour i < 10**8
+        mobile = f"{mobile_prefix}{(i * 7919 + seed) % 10 ** 8:08d}"
+        price = min(3500.0, max(900.0, round(rng.gauss(1700, 300) / 50) * 50))
+        yield (
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            mobile,
+            rng.choices(*cities)[0],
+            ', '.join(_sample(rng, *areas, 1, 3)),
+            price,
+            rng.choices(*vehicles)[0],
+            rng.choices(*nationalities)[0],
+            ', '.join(_sample(rng, *destinations, 1, 2)),
+        )
+
+def write_csv(path, rows):
+    """Écrit les lignes dans un fichier CSV lisible par load_from_excel; retourne leur nombre"""
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(DRIVER_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    return written
+
+def write_xlsx(path, rows):
+    """Écrit les lignes dans un fichier Excel (mode écriture seule d'openpyxl); retourne leur nombre"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(DRIVER_COLUMNS)
+    written = 0
+    for row in rows:
+        sheet.append(row)
+        written += 1
+    workbook.save(path)
+    return written